@@ -0,0 +1,187 @@
+import os
+import random
+import statistics
+import time
+import mysql.connector
+from migrations import MIGRATIONS, apply_migrations
+
+# Seeds a scratch database with ~1M user_permission rows and records the EXPLAIN plan and
+# latency of the permission hot-path queries before and after the schema migrations are applied.
+#
+#   docker compose exec web python app/cerberus/benchmark_indexes.py
+#
+# The report is printed and, with BENCH_REPORT=<path>, also written there as Markdown.
+#
+# The scratch database is dropped and recreated on every run; `auth` is never touched.
+
+BENCH_DATABASE = os.getenv("BENCH_DATABASE", "auth_bench")
+N_USERS = int(os.getenv("BENCH_USERS", "2000"))
+N_ELEMENTS = int(os.getenv("BENCH_ELEMENTS", "100000"))
+N_USER_PERMISSIONS = int(os.getenv("BENCH_USER_PERMISSIONS", "1000000"))
+N_SAMPLES = int(os.getenv("BENCH_SAMPLES", "50"))
+BENCH_REPORT = os.getenv("BENCH_REPORT")
+CHUNK_SIZE = 10000
+
+QUERIES = [
+    (
+        "get_viewable_elements",
+        """
+            SELECT e.id, up.user_id
+            FROM element e
+            INNER JOIN component c ON e.component_id = c.id
+            INNER JOIN permission p ON e.id = p.elem_id
+            INNER JOIN user_permission up ON p.id = up.permission_id
+            WHERE up.user_id = %s AND c.name = %s AND p.operation_id = 1;
+        """,
+        lambda: (random.randint(1, N_USERS), "experiment")
+    ),
+    (
+        "edit_user_permission (highest level)",
+        """
+            SELECT op.name
+            FROM user_permission up
+            INNER JOIN permission p ON up.permission_id = p.id
+            INNER JOIN operation op ON p.operation_id = op.id
+            WHERE up.user_id = %s AND elem_id = %s
+            ORDER BY op.id desc
+            LIMIT 1;
+        """,
+        lambda: (random.randint(1, N_USERS), random.randint(1, N_ELEMENTS))
+    ),
+    (
+        "edit_user_permission (permission rows)",
+        "SELECT id, operation_id FROM permission WHERE elem_id = %s;",
+        lambda: (random.randint(1, N_ELEMENTS),)
+    ),
+    (
+        "edit_user_permission (grants to revoke)",
+        "SELECT id FROM user_permission WHERE user_id = %s AND permission_id IN (%s, %s, %s, %s);",
+        lambda: (random.randint(1, N_USERS), *[random.randint(1, N_ELEMENTS * 4) for _ in range(4)])
+    ),
+    (
+        "user_permission (by element name)",
+        "SELECT id FROM element WHERE elem_name = %s;",
+        lambda: (f"element_{random.randint(1, N_ELEMENTS)}",)
+    )
+]
+
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=os.getenv("MYSQL_HOST", "db"),
+        user=os.getenv("MYSQL_USER", "blendata"),
+        password=os.getenv("MYSQL_PASSWORD", "l;ylfu=k;F]d1"),
+        database=database
+    )
+
+
+def insert_chunked(conn, cursor, query, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        cursor.executemany(query, rows[i:i + CHUNK_SIZE])
+        conn.commit()
+
+
+def seed(conn):
+    # imported here so that the Flask app module is only loaded when seeding
+    from main import create_table_queries, insert_row_queries
+
+    cursor = conn.cursor()
+    for _, query in create_table_queries:
+        cursor.execute(query)
+    for _, query in insert_row_queries:
+        cursor.execute(query)
+
+    random.seed(42)
+    users = [(f"user_{i}",) for i in range(1, N_USERS + 1)]
+    insert_chunked(conn, cursor, "INSERT INTO user (name) VALUES (%s);", users)
+
+    elements = [(i, random.randint(1, 2), f"element_{i}") for i in range(1, N_ELEMENTS + 1)]
+    insert_chunked(conn, cursor, "INSERT INTO element (id, component_id, elem_name) VALUES (%s, %s, %s);", elements)
+
+    permissions = [(elem_id, op_id) for elem_id in range(1, N_ELEMENTS + 1) for op_id in range(1, 5)]
+    insert_chunked(conn, cursor, "INSERT INTO permission (elem_id, operation_id) VALUES (%s, %s);", permissions)
+
+    user_permissions = [(random.randint(1, N_USERS), random.randint(1, len(permissions))) for _ in range(N_USER_PERMISSIONS)]
+    insert_chunked(conn, cursor, "INSERT INTO user_permission (user_id, permission_id) VALUES (%s, %s);", user_permissions)
+
+    cursor.execute("ANALYZE TABLE element, permission, user_permission;")
+    cursor.fetchall()
+    cursor.close()
+
+
+def explain(conn):
+    # -> {query name: [(table, access type, key, estimated rows, extra)]} for one sample of parameters
+    cursor = conn.cursor(buffered=True, dictionary=True)
+    plans = {}
+    for name, query, make_params in QUERIES:
+        random.seed(7)
+        cursor.execute(f"EXPLAIN {query.strip()}", make_params())
+        plans[name] = [(r["table"], r["type"], r["key"], r["rows"], r["Extra"]) for r in cursor.fetchall()]
+    cursor.close()
+    return plans
+
+
+def measure(conn):
+    cursor = conn.cursor(buffered=True)
+    results = {}
+    for name, query, make_params in QUERIES:
+        random.seed(7)
+        timings = []
+        for _ in range(N_SAMPLES):
+            started = time.perf_counter()
+            cursor.execute(query, make_params())
+            cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = (statistics.median(timings), max(timings))
+    cursor.close()
+    return results
+
+
+def main():
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {BENCH_DATABASE};")
+    cursor.execute(f"CREATE DATABASE {BENCH_DATABASE};")
+    cursor.close()
+    conn.close()
+
+    conn = connect(BENCH_DATABASE)
+    try:
+        print(f"Seeding {N_USERS} users, {N_ELEMENTS} elements, {N_USER_PERMISSIONS} user_permission rows...")
+        started = time.perf_counter()
+        seed(conn)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s.")
+
+        plans_before, before = explain(conn), measure(conn)
+        apply_migrations(conn, MIGRATIONS)
+        plans_after, after = explain(conn), measure(conn)
+
+        lines = [
+            f"Seeded {N_USERS} users, {N_ELEMENTS} elements, {N_USER_PERMISSIONS} user_permission rows; "
+            f"{N_SAMPLES} samples per query.",
+            "",
+            "| query | before p50 ms | before max ms | after p50 ms | after max ms | speedup |",
+            "| --- | ---: | ---: | ---: | ---: | ---: |"
+        ]
+        for name, _, _ in QUERIES:
+            (b, b_max), (a, a_max) = before[name], after[name]
+            lines.append(f"| {name} | {b:.2f} | {b_max:.2f} | {a:.2f} | {a_max:.2f} | {b / a if a else float('inf'):.1f}x |")
+        for name, _, _ in QUERIES:
+            lines += ["", f"### {name}", "", "| | table | type | key | rows | extra |", "| --- | --- | --- | --- | ---: | --- |"]
+            for label, plans in (("before", plans_before), ("after", plans_after)):
+                for table, access, key, rows, extra in plans[name]:
+                    lines.append(f"| {label} | {table} | {access} | {key or ''} | {rows} | {extra or ''} |")
+
+        report = "\n".join(lines) + "\n"
+        print()
+        print(report)
+        if BENCH_REPORT:
+            with open(BENCH_REPORT, "w") as f:
+                f.write(report)
+
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
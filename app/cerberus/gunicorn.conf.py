@@ -0,0 +1,41 @@
+import os
+
+# Production server settings for `CERBERUS_MODE=gunicorn python main.py`
+# (or `gunicorn main:app` from this directory).
+
+
+def cpu_count():
+    # honours container CPU pinning where the platform exposes it
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+# Every worker holds its own permission index. A worker's writes are appended to a shared change log
+# (PERMISSION_CHANGE_LOG), and the other workers reload the changed elements from MySQL before
+# their next index read, so all workers must share the file (one host).
+workers = int(os.getenv("WEB_CONCURRENCY", str(cpu_count())))
+worker_class = "gthread"
+# each request thread holds one pooled MySQL connection, so threads default to DB_POOL_SIZE
+threads = int(os.getenv("GUNICORN_THREADS", os.getenv("DB_POOL_SIZE", "5")))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+# the connection pool and the permission index are built in post_worker_init, never in the master
+preload_app = False
+
+
+def on_starting(server):
+    import main
+    if not main.init_database():
+        raise RuntimeError("Could not initialize the database")
+
+
+def post_worker_init(worker):
+    import main
+    main.init_worker()
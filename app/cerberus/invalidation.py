@@ -0,0 +1,114 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+
+
+class InvalidationLog:
+    # Permission changes shared between gunicorn workers on one host, in the same format as
+    # heimdall's invalidation log. Every committed change is appended to a file as one JSON line;
+    # before answering from its permission index a worker replays the lines other workers appended
+    # since it last looked.
+    #
+    # The file is rotated by renaming it once it exceeds max_bytes. Writers hold a shared flock while
+    # they append and the rotation holds it exclusively, so every line of a renamed file was written
+    # before the rename; a process that notices the rotation reloads its whole index.
+    def __init__(self, path, handlers, on_reset, max_bytes=4 * 1024 * 1024):
+        self.path = path or os.path.join(tempfile.gettempdir(), "cerberus-permission-changes.log")
+        self.handlers = handlers  # event name -> function applying it to this process' index
+        self.on_reset = on_reset  # called when events may have been missed; reloads the whole index
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pid = None
+        self.fd = None
+        self.inode = None
+        self.offset = 0
+        self.buffer = b""
+
+    def open(self):
+        # opened lazily so each forked worker gets its own descriptor; history before that is not replayed,
+        # so a worker syncs once before it loads its index
+        fd = os.open(self.path, os.O_RDONLY | os.O_CREAT, 0o644)
+        st = os.fstat(fd)
+        self.pid = os.getpid()
+        self.fd = fd
+        self.inode = st.st_ino
+        self.offset = st.st_size
+        self.buffer = b""
+
+    def locked(self, mode):
+        f = open(f"{self.path}.lock", "a")
+        fcntl.flock(f, mode)
+        return f
+
+    def publish(self, event, *args):
+        line = (json.dumps({"pid": os.getpid(), "event": event, "args": list(args)}, default=str) + "\n").encode()
+        try:
+            lock = self.locked(fcntl.LOCK_SH)
+            try:
+                # opened by path on every write, so a rotated file is never appended to
+                fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, line)
+                    size = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+            finally:
+                lock.close()
+            if size > self.max_bytes:
+                self.rotate()
+        except OSError as err:
+            print(f"Invalidation log write failed: {err}")
+
+    def rotate(self):
+        lock = self.locked(fcntl.LOCK_EX)
+        try:
+            if os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except OSError:
+            pass
+        finally:
+            lock.close()
+
+    def read_new(self):
+        data = os.pread(self.fd, max(os.fstat(self.fd).st_size - self.offset, 0), self.offset)
+        self.offset += len(data)
+        lines = (self.buffer + data).split(b"\n")
+        # a line whose newline has not been read yet is kept for the next sync
+        self.buffer = lines.pop()
+        return lines
+
+    def sync(self):
+        pid = os.getpid()
+        with self.lock:
+            try:
+                if self.pid != pid:
+                    self.open()
+                    return
+                try:
+                    inode = os.stat(self.path).st_ino
+                except FileNotFoundError:
+                    inode = None
+                if inode != self.inode:
+                    os.close(self.fd)
+                    self.open()
+                    self.on_reset()
+                    return
+                lines = self.read_new()
+            except OSError as err:
+                print(f"Invalidation log read failed: {err}")
+                self.on_reset()
+                return
+
+            # applied under the lock, so a thread that finds nothing new knows earlier changes are in effect
+            for line in lines:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("pid") == pid:
+                    continue
+                handler = self.handlers.get(event.get("event"))
+                if handler is not None:
+                    handler(*event.get("args", []))
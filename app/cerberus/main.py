@@ -1,8 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import mysql.connector
 import os
+import json
 import time
+import threading
 from contextlib import contextmanager
+from permission_index import PermissionIndex
+from invalidation import InvalidationLog
+from migrations import apply_migrations
 
 app = Flask(__name__)
 
@@ -110,7 +115,26 @@ insert_row_queries = [
     ("operation", "INSERT IGNORE INTO operation (name) VALUE ('view'), ('edit'), ('delete'), ('manage')")
 ]
 
+# position in the list is the operation id; holding a level implies every level below it
+OPERATION_LEVELS = [None, "view", "edit", "delete", "manage"]
+
 db_pool = None
+component_ids = {}
+operation_ids = None
+
+# read endpoints answer from this index once it is loaded; set PERMISSION_INDEX=0 to always query MySQL
+PERMISSION_INDEX_ENABLED = os.getenv("PERMISSION_INDEX", "1") == "1"
+# seconds between attempts to rebuild an index that was dropped after a failed refresh
+PERMISSION_INDEX_RETRY = float(os.getenv("PERMISSION_INDEX_RETRY", "30"))
+permission_index = PermissionIndex()
+
+MAX_BATCH_CHECKS = int(os.getenv("MAX_BATCH_CHECKS", "1000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BULK_MAX_IDS = int(os.getenv("BULK_MAX_IDS", "5000"))
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+
+# pooled connections per process; under gunicorn every worker builds its own pool after the fork
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
 
 
 def get_db_connection():
@@ -156,134 +180,170 @@ def setup_tables(conn):
 
 
 def get_component_id(comp_name):
+    # components are seeded once and never change, so hits are cached for the process lifetime
+    key = comp_name.lower()
+    if key in component_ids:
+        return component_ids[key]
+
     with get_db_cursor() as cursor:
         query = "SELECT id FROM component WHERE name = %s;"
         cursor.execute(query, (comp_name,))
         res = cursor.fetchone()
     
+    if res:
+        component_ids[key] = res[0]
     return res[0] if res else None
 
 
-def get_elem_id(elem_name):
-    with get_db_cursor() as cursor:
-        query = "SELECT id FROM element WHERE elem_name = %s;"
-        cursor.execute(query, (elem_name,))
-        res = cursor.fetchone()
-    
-    return res[0] if res else None
-
-
-def get_permission_id(elem_id, operation_ids):
-    if not isinstance(operation_ids, list) and operation_ids is not None:
-        operation_ids = [operation_ids]
-        
-    with get_db_cursor() as cursor:
-        if not operation_ids:
-            cursor.execute("SELECT id FROM permission WHERE elem_id = %s;", (elem_id,))
-        else:
-            format_strings = ','.join(['%s'] * len(operation_ids))
-            query = f"SELECT id FROM permission WHERE elem_id = %s AND operation_id IN ({format_strings});"
-            cursor.execute(query, [elem_id] + operation_ids)
-        res = cursor.fetchall()
+def get_operation_ids():
+    global operation_ids
+    if operation_ids is None:
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT id FROM operation ORDER BY id;")
+            operation_ids = [r[0] for r in cursor.fetchall()]
     
-    return [r[0] for r in res] if res else []
+    return operation_ids
+
+
+def register_element(cursor, elem_id, comp_id, elem_name, user_id, op_ids):
+    # runs inside the caller's transaction; generated ids come from lastrowid.
+    # multi-row VALUES inserts are "simple inserts" for InnoDB, so their ids are consecutive
+    cursor.execute("INSERT INTO element (id, component_id, elem_name, created_by) VALUES (%s, %s, %s, %s);", (elem_id, comp_id, elem_name, user_id))
+    elem_id = elem_id if elem_id is not None else cursor.lastrowid
+
+    values_template = ",".join(["(%s, %s)"] * len(op_ids))
+    params = []
+    for op in op_ids:
+        params.extend([elem_id, op])
+    cursor.execute(f"INSERT INTO permission (elem_id, operation_id) VALUES {values_template};", params)
+    permission_id = list(range(cursor.lastrowid, cursor.lastrowid + len(op_ids)))
+
+    params = []
+    for pm in permission_id:
+        params.extend([user_id, pm])
+    cursor.execute(f"INSERT INTO user_permission (user_id, permission_id) VALUES {values_template};", params)
+    user_permission_id = list(range(cursor.lastrowid, cursor.lastrowid + len(permission_id)))
+
+    return elem_id, permission_id, user_permission_id
+
+
+def delete_elements(cursor, elem_ids):
+    # permission and user_permission rows go with their element through ON DELETE CASCADE (migration 5)
+    format_strings = ",".join(["%s"] * len(elem_ids))
+    cursor.execute(f"DELETE FROM element WHERE id IN ({format_strings});", elem_ids)
+    return cursor.rowcount
+
+
+def values_placeholders(n_rows, n_cols):
+    row = "(" + ", ".join(["%s"] * n_cols) + ")"
+    return ",".join([row] * n_rows)
+
+
+def bulk_register_elements(cursor, rows, op_ids):
+    # rows: [(row_no, elem_id, comp_id, comp_name, elem_name, user_id)]
+    # returns ([(row, elem_id)], [(row_no, error)]); runs inside the caller's transaction
+    failed = []
+    explicit_ids = [r[1] for r in rows if r[1] is not None]
+    existing = set()
+    if explicit_ids:
+        format_strings = ",".join(["%s"] * len(explicit_ids))
+        cursor.execute(f"SELECT id FROM element WHERE id IN ({format_strings});", explicit_ids)
+        existing = {r[0] for r in cursor.fetchall()}
+
+    accepted = []
+    for row in rows:
+        if row[1] is not None:
+            if row[1] in existing:
+                failed.append((row[0], f"Element {row[1]} already exists"))
+                continue
+            existing.add(row[1])
+        accepted.append(row)
+
+    # explicit and generated ids go in separate statements: a statement mixing both
+    # is a "mixed-mode insert" and its generated ids are not guaranteed to be consecutive
+    explicit = [r for r in accepted if r[1] is not None]
+    generated = [r for r in accepted if r[1] is None]
+    registered = []
+
+    if explicit:
+        params = []
+        for _, elem_id, comp_id, _, elem_name, user_id in explicit:
+            params.extend([elem_id, comp_id, elem_name, user_id])
+        cursor.execute(f"INSERT INTO element (id, component_id, elem_name, created_by) VALUES {values_placeholders(len(explicit), 4)};", params)
+        registered.extend((r, r[1]) for r in explicit)
 
+    if generated:
+        params = []
+        for _, _, comp_id, _, elem_name, user_id in generated:
+            params.extend([comp_id, elem_name, user_id])
+        cursor.execute(f"INSERT INTO element (component_id, elem_name, created_by) VALUES {values_placeholders(len(generated), 3)};", params)
+        registered.extend((r, cursor.lastrowid + i) for i, r in enumerate(generated))
 
-def get_user_permission_id(user_id, permission_ids):
-    if not isinstance(permission_ids, list):
-        permission_ids = [permission_ids]
-        
-    with get_db_cursor() as cursor:
-        format_strings = ','.join(['%s'] * len(permission_ids))
-        if not user_id:
-            query = f"SELECT id FROM user_permission WHERE permission_id IN ({format_strings});"
-            cursor.execute(query, permission_ids)
-        else:
-            query = f"SELECT id FROM user_permission WHERE user_id = %s AND permission_id IN ({format_strings});"
-            cursor.execute(query, [user_id] + permission_ids)
-        res = cursor.fetchall()
-    
-    return [r[0] for r in res] if res else []
+    if not registered:
+        return registered, failed
 
+    params = []
+    for _, elem_id in registered:
+        for op in op_ids:
+            params.extend([elem_id, op])
+    cursor.execute(f"INSERT INTO permission (elem_id, operation_id) VALUES {values_placeholders(len(registered) * len(op_ids), 2)};", params)
+    first_permission_id = cursor.lastrowid
 
-def insert_element(elem_id, comp_id, elem_name, user_id):
-    with get_db_cursor() as cursor:
-        cursor.execute("INSERT INTO element (id, component_id, elem_name, created_by) VALUES (%s, %s, %s, %s);", (elem_id, comp_id, elem_name, user_id))
-    return get_elem_id(elem_name)
+    params = []
+    for i, (row, _) in enumerate(registered):
+        for j in range(len(op_ids)):
+            params.extend([row[5], first_permission_id + i * len(op_ids) + j])
+    cursor.execute(f"INSERT INTO user_permission (user_id, permission_id) VALUES {values_placeholders(len(registered) * len(op_ids), 2)};", params)
 
+    return registered, failed
 
-def delete_element(elem_id):
-    with get_db_cursor() as cursor:
-        cursor.execute("DELETE FROM element WHERE id = %s;", (elem_id,))
-    return elem_id
 
+# =========================
+# Permission index sync
+# =========================
 
-def insert_permission(elem_id, operation_id):
-    ops = operation_id if isinstance(operation_id, list) else [operation_id]
-    
-    with get_db_cursor() as cursor:
-        values_template = ",".join(["(%s, %s)"] * len(ops))
-        query = f"INSERT INTO permission (elem_id, operation_id) VALUES {values_template};"
-        
-        params = []
-        for op in ops:
-            params.extend([elem_id, op])
-            
-        cursor.execute(query, params)
-    
-    return get_permission_id(elem_id, ops)
+def refresh_elements(elem_ids):
+    try:
+        permission_index.refresh(get_db_cursor, elem_ids, BULK_CHUNK_SIZE)
+    except Exception as err:
+        # a change that could not be applied leaves the index stale; reads go to MySQL until it is rebuilt
+        print(f"Permission index refresh failed: {err}")
+        permission_index.loaded = False
 
 
-def delete_permission(permission_id, elem_id):
-    if not permission_id:
-        permission_id = get_permission_id(elem_id, None) 
-    if not permission_id:
-        return []
+def reload_permission_index():
+    try:
+        permission_index.rebuild(get_db_cursor)
+    except Exception as err:
+        print(f"Permission index rebuild failed: {err}")
+        permission_index.loaded = False
 
-    ids_to_delete = permission_id if isinstance(permission_id, list) else [permission_id]
 
-    with get_db_cursor() as cursor:
-        placeholders = ", ".join(["%s"] * len(ids_to_delete))
-        query = f"DELETE FROM permission WHERE id IN ({placeholders});"
-        cursor.execute(query, ids_to_delete)
-        
-    return ids_to_delete
+# every worker has its own index; the elements a worker changes are reloaded by the others from MySQL
+permission_changes = InvalidationLog(os.getenv("PERMISSION_CHANGE_LOG"), {"elements": refresh_elements}, reload_permission_index)
+index_retry_lock = threading.Lock()
+index_retry_at = 0
 
 
-def insert_user_permission(user_id, permission_id):
-    pms = permission_id if isinstance(permission_id, list) else [permission_id]
-    
-    with get_db_cursor() as cursor:
-        values_template = ",".join(["(%s, %s)"] * len(pms))
-        query = f"INSERT INTO user_permission (user_id, permission_id) VALUES {values_template};"
-        
-        params = []
-        for pm in pms:
-            params.extend([user_id, pm])
-            
-        cursor.execute(query, params)
-    
-    return get_user_permission_id(user_id, pms)
+def publish_permission_changes(elem_ids):
+    # called after the change is committed and applied to this worker's own index
+    if PERMISSION_INDEX_ENABLED and elem_ids:
+        permission_changes.publish("elements", list(elem_ids))
 
 
-def delete_user_permission(user_permission_id, user_id, permission_id):
-    pms = permission_id if isinstance(permission_id, list) else [permission_id]
-    if not user_permission_id:
-        if not user_id:
-            ids_to_delete = get_user_permission_id(None, pms)
-        else:
-            ids_to_delete = get_user_permission_id(user_id, pms)
-    else:
-        ids_to_delete = user_permission_id
-    if not isinstance(ids_to_delete, list):
-        ids_to_delete = [ids_to_delete]
-
-    with get_db_cursor() as cursor:
-        format_strings = ", ".join(["%s"] * len(ids_to_delete))
-        query = f"DELETE FROM user_permission WHERE id IN ({format_strings});"
-        cursor.execute(query, ids_to_delete)
-    
-    return ids_to_delete
+def sync_permission_index():
+    global index_retry_at
+    if not PERMISSION_INDEX_ENABLED:
+        return
+    permission_changes.sync()
+    if permission_index.loaded or not index_retry_lock.acquire(blocking=False):
+        return
+    try:
+        if time.time() >= index_retry_at:
+            index_retry_at = time.time() + PERMISSION_INDEX_RETRY
+            reload_permission_index()
+    finally:
+        index_retry_lock.release()
 
 
 @contextmanager
@@ -318,43 +378,132 @@ def index():
 def get_user_permission():
     user_id = request.headers.get("X-User-Id")
     elem_id = request.args.get("elem_id")
+    comp_name = request.args.get("comp_name")
+    elem_name = request.args.get("elem_name")
     operation_name = request.args.get("operation_name")
 
-    with get_db_cursor() as cursor:
-        query = """
-            SELECT op.name
-            FROM permission p
-            INNER JOIN user_permission up ON p.id = up.permission_id
-            INNER JOIN operation op ON p.operation_id = op.id
-            WHERE up.user_id = %s AND p.elem_id = %s AND op.name = %s;
-        """
-        cursor.execute(query, (user_id, elem_id, operation_name))
-        res = cursor.fetchone()
+    # elements without an external id (registered models) are addressed by component and name
+    if elem_id is not None:
+        elem_ids = [elem_id]
+    elif comp_name and elem_name:
+        with get_db_cursor() as cursor:
+            query = """
+                SELECT e.id
+                FROM element e
+                INNER JOIN component c ON e.component_id = c.id
+                WHERE c.name = %s AND e.elem_name = %s;
+            """
+            cursor.execute(query, (comp_name, elem_name))
+            elem_ids = [r[0] for r in cursor.fetchall()]
+    else:
+        return jsonify({"error": "'elem_id' or 'comp_name' and 'elem_name' are required"}), 400
+
+    sync_permission_index()
+    if permission_index.loaded:
+        res = any(permission_index.has_permission(user_id, e, operation_name) for e in elem_ids)
+    elif not elem_ids:
+        res = None
+    else:
+        with get_db_cursor() as cursor:
+            elem_strings = ",".join(["%s"] * len(elem_ids))
+            query = f"""
+                SELECT op.name
+                FROM permission p
+                INNER JOIN user_permission up ON p.id = up.permission_id
+                INNER JOIN operation op ON p.operation_id = op.id
+                WHERE up.user_id = %s AND p.elem_id IN ({elem_strings}) AND op.name = %s;
+            """
+            cursor.execute(query, [user_id] + elem_ids + [operation_name])
+            res = cursor.fetchone()
 
     return jsonify({
         "has_permission": bool(res),
         "user_id": user_id, 
-        "elem_id": elem_id, 
+        "elem_id": elem_id if elem_id is not None else (elem_ids[0] if elem_ids else None), 
         "operation_name": operation_name
     }), 200
 
 
+@app.route("/api/user_permissions", methods=["POST"])
+def get_user_permissions():
+    user_id = request.headers.get("X-User-Id")
+    data = request.json or {}
+    checks = data.get("checks")
+
+    if not isinstance(checks, list) or not checks:
+        return jsonify({"error": "'checks' must be a non-empty list of (elem_id, operation_name) pairs"}), 400
+    if len(checks) > MAX_BATCH_CHECKS:
+        return jsonify({"error": f"At most {MAX_BATCH_CHECKS} checks are allowed per request"}), 400
+
+    # accept {"elem_id": .., "operation_name": ..} objects as well as [elem_id, operation_name] pairs
+    pairs = []
+    for check in checks:
+        if isinstance(check, dict):
+            pairs.append((check.get("elem_id"), check.get("operation_name")))
+        elif isinstance(check, list) and len(check) == 2:
+            pairs.append((check[0], check[1]))
+        else:
+            return jsonify({"error": "Each check must be an object or a 2-item list"}), 400
+
+    sync_permission_index()
+    if permission_index.loaded:
+        granted = {
+            (str(elem_id), str(operation_name).lower())
+            for elem_id, operation_name in pairs
+            if permission_index.has_permission(user_id, elem_id, operation_name)
+        }
+    else:
+        elem_ids = list({str(elem_id) for elem_id, _ in pairs})
+        operation_names = list({str(operation_name).lower() for _, operation_name in pairs})
+        elem_strings = ",".join(["%s"] * len(elem_ids))
+        operation_strings = ",".join(["%s"] * len(operation_names))
+
+        # one query for the whole batch; the pairing is resolved below
+        with get_db_cursor() as cursor:
+            query = f"""
+                SELECT p.elem_id, op.name
+                FROM permission p
+                INNER JOIN user_permission up ON p.id = up.permission_id
+                INNER JOIN operation op ON p.operation_id = op.id
+                WHERE up.user_id = %s AND p.elem_id IN ({elem_strings}) AND op.name IN ({operation_strings});
+            """
+            cursor.execute(query, [user_id] + elem_ids + operation_names)
+            res = cursor.fetchall()
+        granted = {(str(elem_id), name.lower()) for elem_id, name in res}
+
+    return jsonify({
+        "user_id": user_id,
+        "results": [
+            {
+                "elem_id": elem_id,
+                "operation_name": operation_name,
+                "has_permission": (str(elem_id), str(operation_name).lower()) in granted
+            }
+            for elem_id, operation_name in pairs
+        ]
+    }), 200
+
+
 @app.route("/api/get_viewable_elements", methods=["GET"])
 def get_viewable_elements():
     user_id = request.headers.get("X-User-Id")
     comp_name = request.args.get("comp_name")
 
-    with get_db_cursor() as cursor:
-        query = """
-            SELECT e.id, up.user_id
-            FROM element e
-            INNER JOIN component c ON e.component_id = c.id
-            INNER JOIN permission p ON e.id = p.elem_id
-            INNER JOIN user_permission up ON p.id = up.permission_id
-            WHERE up.user_id = %s AND c.name = %s AND p.operation_id = 1;
-        """
-        cursor.execute(query, (user_id, comp_name))
-        res = cursor.fetchall()
+    sync_permission_index()
+    if permission_index.loaded:
+        res = permission_index.viewable_elements(user_id, comp_name)
+    else:
+        with get_db_cursor() as cursor:
+            query = """
+                SELECT e.id, up.user_id
+                FROM element e
+                INNER JOIN component c ON e.component_id = c.id
+                INNER JOIN permission p ON e.id = p.elem_id
+                INNER JOIN user_permission up ON p.id = up.permission_id
+                WHERE up.user_id = %s AND c.name = %s AND p.operation_id = 1;
+            """
+            cursor.execute(query, (user_id, comp_name))
+            res = cursor.fetchall()
 
     return jsonify({
         "user_id": user_id, 
@@ -379,9 +528,13 @@ def add_element():
     if comp_id is None:
         return jsonify({"error": f"Component '{comp_name}' not found"}), 404
     
-    elem_id = insert_element(elem_id, comp_id, elem_name, user_id)
-    permission_id = insert_permission(elem_id, list(range(1, 5)))
-    user_permission_id = insert_user_permission(user_id, permission_id)
+    op_ids = get_operation_ids()
+
+    # element, permission and owner rows are written on one connection and committed together
+    with get_db_cursor() as cursor:
+        elem_id, permission_id, user_permission_id = register_element(cursor, elem_id, comp_id, elem_name, user_id, op_ids)
+    permission_index.add_element(elem_id, comp_name, user_id, op_ids)
+    publish_permission_changes([elem_id])
 
     return jsonify({
         "component_name": comp_name, 
@@ -393,9 +546,136 @@ def add_element():
     }), 200
 
 
+def iter_bulk_rows():
+    # NDJSON bodies are read line by line from the request stream; JSON bodies may be
+    # a list of elements or {"elements": [...]}
+    if request.mimetype in NDJSON_MIMETYPES:
+        for row_no, line in enumerate(request.stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield row_no, json.loads(line)
+            except ValueError:
+                yield row_no, None
+    else:
+        data = request.get_json(silent=True)
+        elements = data.get("elements") if isinstance(data, dict) else data
+        for row_no, element in enumerate(elements if isinstance(elements, list) else [], 1):
+            yield row_no, element
+
+
+def validate_bulk_row(row_no, element, default_user_id):
+    if not isinstance(element, dict):
+        return None, "Row is not a JSON object"
+
+    comp_name = element.get("component_name")
+    elem_name = element.get("elem_name")
+    if not comp_name or not elem_name:
+        return None, "'component_name' and 'elem_name' are required"
+    if not isinstance(comp_name, str) or not isinstance(elem_name, str):
+        return None, "'component_name' and 'elem_name' must be strings"
+    if len(elem_name) > 100:
+        return None, "'elem_name' must be at most 100 characters"
+
+    elem_id = element.get("elem_id")
+    user_id = element.get("user_id", default_user_id)
+    # integers or integer strings only; int() would also accept booleans and truncate floats
+    if any(isinstance(v, (bool, float)) for v in (elem_id, user_id)):
+        return None, "'elem_id' and 'user_id' must be integers"
+    try:
+        elem_id = int(elem_id) if elem_id is not None else None
+        user_id = int(user_id) if user_id is not None else None
+    except (TypeError, ValueError):
+        return None, "'elem_id' and 'user_id' must be integers"
+
+    try:
+        comp_id = get_component_id(comp_name)
+    except mysql.connector.Error as err:
+        return None, str(err)
+    if comp_id is None:
+        return None, f"Component '{comp_name}' not found"
+
+    return (row_no, elem_id, comp_id, comp_name, elem_name, user_id), None
+
+
+@app.route("/api/bulk_add_elements", methods=["POST"])
+def bulk_add_elements():
+    default_user_id = request.headers.get("X-User-Id")
+    op_ids = get_operation_ids()
+
+    def register_chunk(rows):
+        try:
+            with get_db_cursor() as cursor:
+                registered, failed = bulk_register_elements(cursor, rows, op_ids)
+        except mysql.connector.Error as err:
+            if len(rows) == 1:
+                return 0, [(rows[0][0], str(err))]
+            # the chunk was rolled back as a whole; retry row by row so only the offending rows fail
+            registered, failed = [], []
+            for row in rows:
+                inserted, row_failed = register_chunk([row])
+                failed.extend(row_failed)
+                if inserted:
+                    registered.append(row)
+            return len(registered), failed
+
+        for row, elem_id in registered:
+            permission_index.add_element(elem_id, row[3], row[5], op_ids)
+        publish_permission_changes([elem_id for _, elem_id in registered])
+        return len(registered), failed
+
+    # one progress line per committed chunk, then a summary line
+    def generate():
+        started = time.time()
+        total_rows = total_inserted = total_failed = 0
+        chunk_no = 0
+        rows, failures = [], []
+
+        def flush():
+            nonlocal total_inserted, total_failed, chunk_no, rows, failures
+            inserted, failed = register_chunk(rows) if rows else (0, [])
+            failures.extend(failed)
+            chunk_no += 1
+            total_inserted += inserted
+            total_failed += len(failures)
+            line = json.dumps({
+                "chunk": chunk_no,
+                "rows": total_rows,
+                "inserted": total_inserted,
+                "failed": total_failed,
+                "failures": [{"row": row_no, "error": error} for row_no, error in failures]
+            }) + "\n"
+            rows, failures = [], []
+            return line
+
+        for row_no, element in iter_bulk_rows():
+            total_rows += 1
+            row, error = validate_bulk_row(row_no, element, default_user_id)
+            if error:
+                failures.append((row_no, error))
+            else:
+                rows.append(row)
+            if len(rows) + len(failures) >= BULK_CHUNK_SIZE:
+                yield flush()
+
+        if rows or failures:
+            yield flush()
+
+        yield json.dumps({
+            "done": True,
+            "rows": total_rows,
+            "inserted": total_inserted,
+            "failed": total_failed,
+            "duration_seconds": time.time() - started
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.route("/api/edit_user_permission", methods=["POST"])
 def edit_user_permission():
-    operation_levels = [None, "view", "edit", "delete", "manage"]
+    operation_levels = OPERATION_LEVELS
 
     user_id_assign = request.headers.get("X-User-Id")
     data = request.json or {}
@@ -406,37 +686,64 @@ def edit_user_permission():
     if not user_id_grant or not elem_id:
         return jsonify({"error": "'user_id' and 'elem_name' are required"}), 400
     
-    # view highest permission the granting user has to the asset
-    with get_db_cursor() as cursor:
-        query = """
-            SELECT op.name 
-            FROM user_permission up 
-            INNER JOIN permission p ON up.permission_id = p.id 
-            INNER JOIN operation op ON p.operation_id = op.id 
-            WHERE up.user_id = %s AND elem_id = %s 
-            ORDER BY op.id desc
-            LIMIT 1;
-        """
+    with permission_index.editing([elem_id]):
+        # one transaction that locks the element's permission rows, like bulk_edit_user_permission,
+        # so single and bulk edits of the same element serialize instead of interleaving
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT id, operation_id FROM permission WHERE elem_id = %s FOR UPDATE;", (elem_id,))
+            permission_ids = {op_id: p_id for p_id, op_id in cursor.fetchall()}
+
+            # view highest permission the granting user has to the asset
+            query = """
+                SELECT op.name 
+                FROM user_permission up 
+                INNER JOIN permission p ON up.permission_id = p.id 
+                INNER JOIN operation op ON p.operation_id = op.id 
+                WHERE up.user_id = %s AND elem_id = %s 
+                ORDER BY op.id desc
+                LIMIT 1;
+            """
         
-        cursor.execute(query, (user_id_grant, elem_id))
-        res = cursor.fetchone()
+            cursor.execute(query, (user_id_grant, elem_id))
+            res = cursor.fetchone()
     
-    operation_name_now = res[0] if res else None
-    operation_id_now = operation_levels.index(operation_name_now)
-    operation_id_next = operation_levels.index(operation_name)
-
-    # if highest permission is lower than the set permission, insert user_permission rows until the highest permission = set permission.
-    if operation_id_now < operation_id_next:
-        permission_id = get_permission_id(elem_id, list(range(operation_id_now + 1, operation_id_next + 1)))
-        user_permission_id = insert_user_permission(user_id_grant, permission_id)
-    # if highest permission is higher than the set permission, remove user_permission rows until the highest permission = set permission.
-    elif operation_id_now > operation_id_next:
-        permission_id = get_permission_id(elem_id, list(range(operation_id_next + 1, operation_id_now + 1)))
-        user_permission_id = delete_user_permission(None, user_id_grant, permission_id)
-    # if highest permission is already equal to the set permission, do nothing
-    else:
-        permission_id = None
-        user_permission_id = None
+            operation_name_now = res[0] if res else None
+            operation_id_now = operation_levels.index(operation_name_now)
+            operation_id_next = operation_levels.index(operation_name)
+
+            # if highest permission is lower than the set permission, insert user_permission rows until the highest permission = set permission.
+            if operation_id_now < operation_id_next:
+                op_ids = [op for op in range(operation_id_now + 1, operation_id_next + 1) if op in permission_ids]
+                permission_id = [permission_ids[op] for op in op_ids]
+                user_permission_id = []
+                if permission_id:
+                    params = []
+                    for pm in permission_id:
+                        params.extend([user_id_grant, pm])
+                    cursor.execute(f"INSERT INTO user_permission (user_id, permission_id) VALUES {values_placeholders(len(permission_id), 2)};", params)
+                    user_permission_id = list(range(cursor.lastrowid, cursor.lastrowid + len(permission_id)))
+            # if highest permission is higher than the set permission, remove user_permission rows until the highest permission = set permission.
+            elif operation_id_now > operation_id_next:
+                op_ids = [op for op in range(operation_id_next + 1, operation_id_now + 1) if op in permission_ids]
+                permission_id = [permission_ids[op] for op in op_ids]
+                format_strings = ",".join(["%s"] * len(permission_id))
+                cursor.execute(f"SELECT id FROM user_permission WHERE user_id = %s AND permission_id IN ({format_strings});", [user_id_grant] + permission_id)
+                user_permission_id = [r[0] for r in cursor.fetchall()]
+                if user_permission_id:
+                    format_strings = ",".join(["%s"] * len(user_permission_id))
+                    cursor.execute(f"DELETE FROM user_permission WHERE id IN ({format_strings});", user_permission_id)
+            # if highest permission is already equal to the set permission, do nothing
+            else:
+                permission_id = None
+                user_permission_id = None
+
+        # the index follows the committed rows
+        if operation_id_now < operation_id_next:
+            permission_index.grant(user_id_grant, elem_id, op_ids)
+        elif operation_id_now > operation_id_next:
+            permission_index.revoke(user_id_grant, elem_id, op_ids)
+        if operation_id_now != operation_id_next:
+            publish_permission_changes([elem_id])
 
     operation_name_prev = operation_name_now
     operation_name_now = operation_name
@@ -452,6 +759,89 @@ def edit_user_permission():
     }), 200
 
 
+@app.route("/api/bulk_edit_user_permission", methods=["POST"])
+def bulk_edit_user_permission():
+    user_id_assign = request.headers.get("X-User-Id")
+    data = request.json or {}
+    user_ids = data.get("user_ids")
+    elem_ids = data.get("elem_ids")
+    operation_name = data.get("operation_name")
+
+    if not isinstance(user_ids, list) or not isinstance(elem_ids, list) or not user_ids or not elem_ids:
+        return jsonify({"error": "'user_ids' and 'elem_ids' must be non-empty lists"}), 400
+    if len(user_ids) > BULK_MAX_IDS or len(elem_ids) > BULK_MAX_IDS:
+        return jsonify({"error": f"At most {BULK_MAX_IDS} user_ids and {BULK_MAX_IDS} elem_ids are allowed per request"}), 400
+    if operation_name not in OPERATION_LEVELS:
+        return jsonify({"error": f"'operation_name' must be one of {OPERATION_LEVELS}"}), 400
+
+    try:
+        user_ids = sorted({int(u) for u in user_ids})
+        elem_ids = sorted({int(e) for e in elem_ids})
+    except (TypeError, ValueError):
+        return jsonify({"error": "'user_ids' and 'elem_ids' must be integers"}), 400
+
+    operation_id_next = OPERATION_LEVELS.index(operation_name)
+    user_strings = ",".join(["%s"] * len(user_ids))
+    elem_strings = ",".join(["%s"] * len(elem_ids))
+
+    with permission_index.editing(elem_ids):
+        # every (user, element) pair ends up holding exactly the levels 1..operation_id_next
+        with get_db_cursor() as cursor:
+            # lock the permission rows of the target elements so concurrent grants on them serialize
+            cursor.execute(f"SELECT id FROM permission WHERE elem_id IN ({elem_strings}) FOR UPDATE;", elem_ids)
+
+            # the index is updated from the rows actually deleted and inserted, never from the request
+            cursor.execute(f"""
+                SELECT up.id, up.user_id, p.elem_id, p.operation_id
+                FROM user_permission up
+                INNER JOIN permission p ON up.permission_id = p.id
+                WHERE up.user_id IN ({user_strings}) AND p.elem_id IN ({elem_strings}) AND p.operation_id > %s;
+            """, user_ids + elem_ids + [operation_id_next])
+            revoked = cursor.fetchall()
+            for i in range(0, len(revoked), BULK_CHUNK_SIZE):
+                chunk = [r[0] for r in revoked[i:i + BULK_CHUNK_SIZE]]
+                cursor.execute(f"DELETE FROM user_permission WHERE id IN ({','.join(['%s'] * len(chunk))});", chunk)
+            deleted = len(revoked)
+
+            # users that do not exist have no row in `user` and so get nothing
+            cursor.execute(f"""
+                SELECT u.id, p.id, p.elem_id, p.operation_id
+                FROM user u
+                INNER JOIN permission p ON p.elem_id IN ({elem_strings}) AND p.operation_id <= %s
+                LEFT JOIN user_permission up ON up.user_id = u.id AND up.permission_id = p.id
+                WHERE u.id IN ({user_strings}) AND up.id IS NULL;
+            """, elem_ids + [operation_id_next] + user_ids)
+            granted = cursor.fetchall()
+            for i in range(0, len(granted), BULK_CHUNK_SIZE):
+                chunk = granted[i:i + BULK_CHUNK_SIZE]
+                params = []
+                for user_id, permission_id, _, _ in chunk:
+                    params.extend([user_id, permission_id, user_id_assign])
+                cursor.execute(f"INSERT INTO user_permission (user_id, permission_id, created_by) VALUES {values_placeholders(len(chunk), 3)};", params)
+            inserted = len(granted)
+
+        changes = {}
+        for _, user_id, elem_id, op_id in revoked:
+            changes.setdefault((user_id, elem_id), ([], []))[1].append(op_id)
+        for user_id, _, elem_id, op_id in granted:
+            changes.setdefault((user_id, elem_id), ([], []))[0].append(op_id)
+        for (user_id, elem_id), (grant_ops, revoke_ops) in changes.items():
+            if grant_ops:
+                permission_index.grant(user_id, elem_id, grant_ops)
+            if revoke_ops:
+                permission_index.revoke(user_id, elem_id, revoke_ops)
+        publish_permission_changes(sorted({elem_id for _, elem_id in changes}))
+
+    return jsonify({
+        "user_id_assign": user_id_assign,
+        "user_ids": user_ids,
+        "elem_ids": elem_ids,
+        "operation_name": operation_name,
+        "inserted": inserted,
+        "deleted": deleted
+    }), 200
+
+
 @app.route("/api/delete_element", methods=["POST"])
 def delete_element_api():
     user_id = request.headers.get("X-User-Id")
@@ -461,10 +851,22 @@ def delete_element_api():
     if not elem_id:
         return jsonify({"error": "'elem_id' is required"}), 400
     
-    permission_id = get_permission_id(elem_id, None)
-    user_permission_id = delete_user_permission(None, None, permission_id)
-    permission_id = delete_permission(None, elem_id)
-    elem_id = delete_element(elem_id)
+    with get_db_cursor() as cursor:
+        # the ids are only collected for the response, the cascade removes the rows
+        query = """
+            SELECT p.id, up.id
+            FROM permission p
+            LEFT JOIN user_permission up ON p.id = up.permission_id
+            WHERE p.elem_id = %s;
+        """
+        cursor.execute(query, (elem_id,))
+        res = cursor.fetchall()
+        delete_elements(cursor, [elem_id])
+    permission_index.remove_element(elem_id)
+    publish_permission_changes([elem_id])
+
+    permission_id = sorted({r[0] for r in res})
+    user_permission_id = sorted({r[1] for r in res if r[1] is not None})
 
     return jsonify({
         "elem_id": elem_id, 
@@ -473,40 +875,154 @@ def delete_element_api():
     }), 200
 
 
-if __name__ == "__main__":
-    max_retries = 10
-    delay = 5
-    
+@app.route("/api/bulk_delete_elements", methods=["POST"])
+def bulk_delete_elements():
+    data = request.json or {}
+    elem_ids = data.get("elem_ids")
+
+    if not isinstance(elem_ids, list) or not elem_ids:
+        return jsonify({"error": "'elem_ids' must be a non-empty list"}), 400
+    try:
+        elem_ids = sorted({int(e) for e in elem_ids})
+    except (TypeError, ValueError):
+        return jsonify({"error": "'elem_ids' must be integers"}), 400
+
+    deleted, not_found, failures = [], [], []
+    for i in range(0, len(elem_ids), BULK_CHUNK_SIZE):
+        chunk = elem_ids[i:i + BULK_CHUNK_SIZE]
+        format_strings = ",".join(["%s"] * len(chunk))
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(f"SELECT id FROM element WHERE id IN ({format_strings}) FOR UPDATE;", chunk)
+                found = [r[0] for r in cursor.fetchall()]
+                if found:
+                    delete_elements(cursor, found)
+        except mysql.connector.Error as err:
+            failures.extend({"elem_id": e, "error": str(err)} for e in chunk)
+            continue
+
+        found_set = set(found)
+        deleted.extend(found)
+        not_found.extend(e for e in chunk if e not in found_set)
+        for elem_id in found:
+            permission_index.remove_element(elem_id)
+        publish_permission_changes(found)
+
+    return jsonify({
+        "requested": len(elem_ids),
+        "deleted": len(deleted),
+        "elem_ids": deleted,
+        "not_found": not_found,
+        "failures": failures
+    }), 200
+
+
+@app.route("/api/permission_index/check", methods=["GET"])
+def check_permission_index():
+    sync_permission_index()
+    if not permission_index.loaded:
+        return jsonify({"error": "Permission index is not loaded"}), 409
+
+    res = permission_index.check(get_db_cursor)
+    res.update(permission_index.stats())
+    return jsonify(res), 200
+
+
+@app.route("/api/permission_index/rebuild", methods=["POST"])
+def rebuild_permission_index():
+    if not PERMISSION_INDEX_ENABLED:
+        return jsonify({"error": "Permission index is disabled"}), 409
+
+    started = time.time()
+    permission_index.rebuild(get_db_cursor)
+
+    res = permission_index.stats()
+    res["duration_seconds"] = time.time() - started
+    return jsonify(res), 200
+
+
+def db_config():
+    return {
+        "host": os.getenv("MYSQL_HOST", "db"),
+        "user": os.getenv("MYSQL_USER", "blendata"),
+        "password": os.getenv("MYSQL_PASSWORD", "l;ylfu=k;F]d1"),
+        "database": os.getenv("MYSQL_DATABASE", "auth")
+    }
+
+
+def wait_for_database(connect, max_retries=10, delay=5):
     print("Waiting for database to be ready...")
     for i in range(max_retries):
         try:
-            db_pool = mysql.connector.pooling.MySQLConnectionPool(
-                pool_name="cerberus_pool",
-                pool_size=5, 
-                host=os.getenv("MYSQL_HOST", "db"),
-                user=os.getenv("MYSQL_USER", "blendata"),
-                password=os.getenv("MYSQL_PASSWORD", "l;ylfu=k;F]d1"),
-                database=os.getenv("MYSQL_DATABASE", "auth")
-            )
-
-            print("Database pool created successfully!")
-            break
+            return connect()
 
         except mysql.connector.Error as err:
             print(f"Database not ready (Attempt {i+1}/{max_retries})...")
             time.sleep(delay)
-    
+
+    return None
+
+
+def create_db_pool(pool_size=DB_POOL_SIZE):
+    global db_pool
+    db_pool = wait_for_database(lambda: mysql.connector.pooling.MySQLConnectionPool(
+        pool_name="cerberus_pool",
+        pool_size=pool_size,
+        **db_config()
+    ))
     if db_pool:
-        conn = get_db_connection()
-        try:
-            setup_database(conn)
-            setup_tables(conn)
-        
-        finally:
-            conn.close()
+        print("Database pool created successfully!")
+    return db_pool
+
+
+def init_database():
+    # schema, migrations and seed rows; runs once, before any worker serves requests
+    conn = wait_for_database(lambda: mysql.connector.connect(**db_config()))
+    if conn is None:
+        return False
+
+    try:
+        setup_database(conn)
+        apply_migrations(conn)
+        setup_tables(conn)
+
+    finally:
+        conn.close()
+
+    return True
+
+
+def load_permission_index():
+    if PERMISSION_INDEX_ENABLED:
+        # the change log is opened first, so changes committed while MySQL is read are replayed afterwards
+        permission_changes.sync()
+        count = permission_index.rebuild(get_db_cursor)
+        print(f"Permission index loaded with {count} grants.")
+
+
+def init_worker():
+    if not create_db_pool():
+        raise RuntimeError("Could not initialize database pool")
+
+    load_permission_index()
+
+
+def run_gunicorn():
+    # production server, configured by gunicorn.conf.py next to this file
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    os.execvp("gunicorn", ["gunicorn", "--chdir", app_dir, "--config", os.path.join(app_dir, "gunicorn.conf.py"), "main:app"])
+
+
+if __name__ == "__main__":
+    # CERBERUS_MODE=gunicorn runs the pre-fork production server instead of Flask's development server
+    if os.getenv("CERBERUS_MODE", "dev") == "gunicorn":
+        run_gunicorn()
+
+    if init_database() and create_db_pool():
+        load_permission_index()
 
         print("Starting Flask app...")
         app.run(host="0.0.0.0", port=5000)
     
     else:
-        print("CRITICAL: Could not initialize database pool. Exiting.")
\ No newline at end of file
+        print("CRITICAL: Could not initialize database pool. Exiting.")
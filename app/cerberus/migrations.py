@@ -0,0 +1,139 @@
+import mysql.connector
+
+LOCK_NAME = "cerberus_schema_migrations"
+LOCK_TIMEOUT = 60
+
+
+def index_exists(cursor, table_name, index_name):
+    cursor.execute("""
+        SELECT 1
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1;
+    """, (table_name, index_name))
+    return cursor.fetchone() is not None
+
+
+def foreign_key_delete_rule(cursor, table_name, constraint_name):
+    cursor.execute("""
+        SELECT delete_rule
+        FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE() AND table_name = %s AND constraint_name = %s;
+    """, (table_name, constraint_name))
+    res = cursor.fetchone()
+    return res[0] if res else None
+
+
+# DDL commits implicitly in MySQL, so every step checks the current schema before changing it
+
+def add_index(table_name, index_name, columns):
+    def step(cursor):
+        if not index_exists(cursor, table_name, index_name):
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} {columns};")
+    return step
+
+
+def cascade_foreign_key(table_name, constraint_name, column, ref_table):
+    def step(cursor):
+        rule = foreign_key_delete_rule(cursor, table_name, constraint_name)
+        if rule == "CASCADE":
+            return
+        if rule is not None:
+            cursor.execute(f"ALTER TABLE {table_name} DROP FOREIGN KEY {constraint_name};")
+        cursor.execute(f"""
+            ALTER TABLE {table_name}
+            ADD CONSTRAINT {constraint_name}
+                FOREIGN KEY ({column})
+                REFERENCES {ref_table}(id)
+                ON DELETE CASCADE;
+        """)
+    return step
+
+
+# Ordered schema migrations applied on top of create_table_queries.
+# Each entry is (version, name, [steps]); never edit an applied migration, append a new one.
+#
+# InnoDB secondary indexes carry the primary key, so (a, b) below also covers `id`.
+# The composite indexes share their leading column with the implicit FK indexes,
+# which MySQL drops on its own once a usable replacement exists.
+MIGRATIONS = [
+    (
+        1,
+        "element_elem_name",
+        # /api/user_permission looks model elements up by name
+        [add_index("element", "idx_element_elem_name", "(elem_name)")]
+    ),
+    (
+        2,
+        "user_permission_user_permission",
+        # get_viewable_elements / edit_user_permission start from one user's grants and join to permission by id
+        [add_index("user_permission", "idx_user_permission_user_permission", "(user_id, permission_id)")]
+    ),
+    (
+        3,
+        "permission_elem_operation",
+        # edit_user_permission locks an element's permission rows and looks up levels by (elem_id, operation_id)
+        [add_index("permission", "idx_permission_elem_operation", "(elem_id, operation_id)")]
+    ),
+    (
+        4,
+        "user_permission_permission_user",
+        # edit_user_permission / bulk_edit_user_permission look up grants by permission_id IN (...) [AND user_id]
+        [add_index("user_permission", "idx_user_permission_permission_user", "(permission_id, user_id)")]
+    ),
+    (
+        5,
+        "element_delete_cascade",
+        # deleting an element removes its permission and user_permission rows in the same statement
+        [
+            cascade_foreign_key("permission", "elem_fk", "elem_id", "element"),
+            cascade_foreign_key("user_permission", "permission_fk", "permission_id", "permission")
+        ]
+    )
+]
+
+
+def get_schema_version(cursor):
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations;")
+    return cursor.fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS, target=None):
+    cursor = conn.cursor(buffered=True)
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(100),
+                applied_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        # several workers may start at once; only one of them runs the migrations
+        cursor.execute("SELECT GET_LOCK(%s, %s);", (LOCK_NAME, LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise mysql.connector.Error(msg="Could not acquire the schema migration lock")
+
+        try:
+            version = get_schema_version(cursor)
+            for migration_version, name, steps in migrations:
+                if migration_version <= version or (target is not None and migration_version > target):
+                    continue
+
+                for step in steps:
+                    step(cursor)
+
+                cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (migration_version, name))
+                conn.commit()
+                print(f"Migration {migration_version} \"{name}\" applied.")
+
+            version = get_schema_version(cursor)
+            print(f"Schema is at version {version}.")
+            return version
+
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s);", (LOCK_NAME,))
+            cursor.fetchone()
+
+    finally:
+        cursor.close()
@@ -0,0 +1,257 @@
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+LOCK_STRIPES = 64
+
+
+def to_key(name):
+    # MySQL compares names with a case-insensitive collation, so the index does too
+    return name.lower() if isinstance(name, str) else name
+
+
+def to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PermissionIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.operations = {}  # operation name -> operation id
+        self.elements = {}    # elem_id -> component name
+        self.holders = {}     # elem_id -> set of user_ids holding any permission on it
+        self.grants = {}      # user_id -> {component name -> {elem_id -> set of operation ids}}
+        self.loaded = False
+        self.loaded_at = None
+        self.pending = None   # mutations recorded while a rebuild is reading MySQL
+        self.stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]  # elem_id % LOCK_STRIPES -> edit lock
+
+    # =========================
+    # Loading
+    # =========================
+
+    @staticmethod
+    def fetch(cursor):
+        cursor.execute("SELECT id, name FROM operation;")
+        operations = {to_key(name): op_id for op_id, name in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT e.id, c.name
+            FROM element e
+            INNER JOIN component c ON e.component_id = c.id;
+        """)
+        elements = {elem_id: to_key(comp_name) for elem_id, comp_name in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT up.user_id, p.elem_id, p.operation_id
+            FROM user_permission up
+            INNER JOIN permission p ON up.permission_id = p.id;
+        """)
+        rows = cursor.fetchall()
+
+        return operations, elements, rows
+
+    def rebuild(self, get_db_cursor):
+        with self.lock:
+            self.pending = []
+
+        try:
+            with get_db_cursor() as cursor:
+                operations, elements, rows = self.fetch(cursor)
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+
+        # the new maps are built on a scratch index, so reads are only blocked for the swap and replay
+        fresh = PermissionIndex()
+        fresh.operations = operations
+        fresh.elements = elements
+        for user_id, elem_id, op_id in rows:
+            fresh._grant(user_id, elem_id, [op_id])
+
+        with self.lock:
+            pending, self.pending = self.pending, None
+            self.operations = fresh.operations
+            self.elements = fresh.elements
+            self.holders = fresh.holders
+            self.grants = fresh.grants
+            # replay writes that landed while MySQL was being read; every mutation is idempotent
+            for method, args in pending:
+                getattr(self, method)(*args)
+            self.loaded = True
+            self.loaded_at = time.time()
+            return len(rows)
+
+    @staticmethod
+    def fetch_elements(cursor, elem_ids):
+        # the rows of just these elements; elements that no longer exist are absent from both results
+        format_strings = ",".join(["%s"] * len(elem_ids))
+        cursor.execute(f"""
+            SELECT e.id, c.name
+            FROM element e
+            INNER JOIN component c ON e.component_id = c.id
+            WHERE e.id IN ({format_strings});
+        """, elem_ids)
+        elements = {elem_id: to_key(comp_name) for elem_id, comp_name in cursor.fetchall()}
+
+        cursor.execute(f"""
+            SELECT up.user_id, p.elem_id, p.operation_id
+            FROM user_permission up
+            INNER JOIN permission p ON up.permission_id = p.id
+            WHERE p.elem_id IN ({format_strings});
+        """, elem_ids)
+        return elements, cursor.fetchall()
+
+    def refresh(self, get_db_cursor, elem_ids, chunk_size=1000):
+        # reloads elements another worker changed; holding their edit locks across the read and the
+        # replace keeps an older read from overwriting a newer one
+        elem_ids = sorted({e for e in map(to_id, elem_ids) if e is not None})
+        for i in range(0, len(elem_ids), chunk_size):
+            chunk = elem_ids[i:i + chunk_size]
+            with self.editing(chunk):
+                with get_db_cursor() as cursor:
+                    elements, rows = self.fetch_elements(cursor, chunk)
+                self.replace_elements(chunk, elements, rows)
+
+    def check(self, get_db_cursor):
+        with get_db_cursor() as cursor:
+            _, elements, rows = self.fetch(cursor)
+
+        expected = {(u, e, o) for u, e, o in rows if e in elements}
+        with self.lock:
+            actual = {
+                (u, e, o)
+                for u, comps in self.grants.items()
+                for elems in comps.values()
+                for e, ops in elems.items()
+                for o in ops
+            }
+            index_elements = set(self.elements)
+
+        missing = sorted(expected - actual)
+        extra = sorted(actual - expected)
+        return {
+            "consistent": not missing and not extra and index_elements == set(elements),
+            "grants": len(expected),
+            "missing_grants": len(missing),
+            "extra_grants": len(extra),
+            "missing_elements": len(set(elements) - index_elements),
+            "extra_elements": len(index_elements - set(elements)),
+            "sample_missing": missing[:20],
+            "sample_extra": extra[:20]
+        }
+
+    # =========================
+    # Mutations
+    # =========================
+
+    @contextmanager
+    def editing(self, elem_ids):
+        # Held by a permission edit from before its transaction until the index is updated, so
+        # edits of one element reach the index in the order they committed. The FOR UPDATE row
+        # locks alone are released at commit, before the index changes.
+        stripes = sorted({hash(to_id(elem_id)) % LOCK_STRIPES for elem_id in elem_ids})
+        with ExitStack() as stack:
+            for i in stripes:
+                stack.enter_context(self.stripes[i])
+            yield
+
+    def _record(self, method, *args):
+        if self.pending is not None:
+            self.pending.append((method, args))
+
+    def _grant(self, user_id, elem_id, op_ids):
+        comp_name = self.elements.get(elem_id)
+        if user_id is None or comp_name is None:
+            return
+        ops = self.grants.setdefault(user_id, {}).setdefault(comp_name, {}).setdefault(elem_id, set())
+        ops.update(op_ids)
+        self.holders.setdefault(elem_id, set()).add(user_id)
+
+    def add_element(self, elem_id, comp_name, user_id, op_ids):
+        elem_id, user_id = to_id(elem_id), to_id(user_id)
+        with self.lock:
+            self._record("add_element", elem_id, comp_name, user_id, op_ids)
+            self.elements[elem_id] = to_key(comp_name)
+            self._grant(user_id, elem_id, op_ids)
+
+    def grant(self, user_id, elem_id, op_ids):
+        user_id, elem_id = to_id(user_id), to_id(elem_id)
+        with self.lock:
+            self._record("grant", user_id, elem_id, op_ids)
+            self._grant(user_id, elem_id, op_ids)
+
+    def revoke(self, user_id, elem_id, op_ids):
+        user_id, elem_id = to_id(user_id), to_id(elem_id)
+        with self.lock:
+            self._record("revoke", user_id, elem_id, op_ids)
+            comp_name = self.elements.get(elem_id)
+            elems = self.grants.get(user_id, {}).get(comp_name, {})
+            ops = elems.get(elem_id)
+            if ops is None:
+                return
+            ops.difference_update(op_ids)
+            if not ops:
+                del elems[elem_id]
+                self.holders.get(elem_id, set()).discard(user_id)
+
+    def _remove_element(self, elem_id):
+        comp_name = self.elements.pop(elem_id, None)
+        for user_id in self.holders.pop(elem_id, set()):
+            self.grants.get(user_id, {}).get(comp_name, {}).pop(elem_id, None)
+
+    def remove_element(self, elem_id):
+        elem_id = to_id(elem_id)
+        with self.lock:
+            self._record("remove_element", elem_id)
+            self._remove_element(elem_id)
+
+    def replace_elements(self, elem_ids, elements, rows):
+        # the index entries of elem_ids become exactly `elements` and `rows` as read from MySQL
+        with self.lock:
+            self._record("replace_elements", elem_ids, elements, rows)
+            for elem_id in elem_ids:
+                self._remove_element(elem_id)
+            self.elements.update(elements)
+            for user_id, elem_id, op_id in rows:
+                self._grant(user_id, elem_id, [op_id])
+
+    # =========================
+    # Reads
+    # =========================
+
+    def has_permission(self, user_id, elem_id, operation_name):
+        user_id, elem_id = to_id(user_id), to_id(elem_id)
+        with self.lock:
+            op_id = self.operations.get(to_key(operation_name))
+            comp_name = self.elements.get(elem_id)
+            ops = self.grants.get(user_id, {}).get(comp_name, {}).get(elem_id, ())
+            return op_id in ops
+
+    def highest_operation(self, user_id, elem_id):
+        user_id, elem_id = to_id(user_id), to_id(elem_id)
+        with self.lock:
+            comp_name = self.elements.get(elem_id)
+            ops = self.grants.get(user_id, {}).get(comp_name, {}).get(elem_id)
+            return max(ops) if ops else None
+
+    def viewable_elements(self, user_id, comp_name):
+        user_id = to_id(user_id)
+        with self.lock:
+            view_id = self.operations.get("view")
+            elems = self.grants.get(user_id, {}).get(to_key(comp_name), {})
+            return [(elem_id, user_id) for elem_id, ops in elems.items() if view_id in ops]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "loaded": self.loaded,
+                "loaded_at": self.loaded_at,
+                "elements": len(self.elements),
+                "users": len(self.grants),
+                "grants": sum(len(ops) for comps in self.grants.values() for elems in comps.values() for ops in elems.values())
+            }
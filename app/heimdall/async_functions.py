@@ -0,0 +1,643 @@
+import os
+import asyncio
+import httpx
+from datetime import datetime
+from functions import url, cerberus_url, headers, MAX_RESULTS, TIMEOUT, MAX_RETRIES, FILL_PAGE_SIZE, FILL_MAX_PAGES
+from functions import fill_permitted_pages
+from functions import viewable_cache, invalidate_viewable_elements, CERBERUS_TIMEOUT
+from functions import entity_cache, evict_experiment, evict_run, evict_model, model_cache, model_server
+from cache import MISSING
+import fastjson
+from fastjson import parse
+
+ASYNC_POOL_SIZE = int(os.getenv("MLFLOW_ASYNC_POOL_SIZE", "256"))
+
+
+# =========================
+# Client
+# =========================
+
+class AsyncMLflowClient:
+    def __init__(self, base_url=url, pool_size=ASYNC_POOL_SIZE, timeout=TIMEOUT, max_retries=MAX_RETRIES, default_headers=headers):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.default_headers = default_headers
+        self.client = None
+
+    def _get_client(self):
+        # httpx.AsyncClient binds to the running event loop, so it is built on
+        # first use inside the server loop rather than at import time
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.default_headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                # httpx only retries failed connection attempts, which is safe for every verb
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries)
+            )
+        return self.client
+
+    async def request(self, method, path, params=None, **kwargs):
+        # requests drops None-valued query params, httpx would send them as empty strings
+        if params is not None:
+            params = {k: v for k, v in params.items() if v is not None}
+        return await self._get_client().request(method, path, params=params, **kwargs)
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+
+client = AsyncMLflowClient()
+cerberus_client = AsyncMLflowClient(base_url=cerberus_url, timeout=CERBERUS_TIMEOUT, default_headers=None)
+
+
+async def close_clients():
+    await client.close()
+    await cerberus_client.close()
+
+
+# =========================
+# Cerberus
+# =========================
+
+async def get_viewable_elements(user_id, comp_name):
+    # shares the TTL/LRU cache with the sync gateway
+    key = (user_id, comp_name)
+    elem_ids = viewable_cache.get(key)
+    if elem_ids is not None:
+        return elem_ids
+
+    generation = viewable_cache.generation
+    res = await cerberus_client.get(
+        "/get_viewable_elements",
+        headers={"X-User-Id": user_id} if user_id else None,
+        params={"comp_name": comp_name}
+    )
+    res.raise_for_status()
+    elem_ids = fastjson.loads(res.content)["elem_ids"]
+    viewable_cache.set(key, elem_ids, generation=generation)
+    return elem_ids
+
+async def add_element(user_id, elem_id, component_name, elem_name):
+    res = await cerberus_client.post(
+        "/add_element",
+        headers={"X-User-Id": user_id} if user_id else None,
+        json={
+            "elem_id": elem_id,
+            "component_name": component_name,
+            "elem_name": elem_name
+        }
+    )
+    invalidate_viewable_elements(user_id=user_id, comp_name=component_name)
+    return parse(res)
+
+async def edit_user_permission(user_id, user_id_grant, elem_id, operation_name):
+    res = await cerberus_client.post(
+        "/edit_user_permission",
+        headers={"X-User-Id": user_id} if user_id else None,
+        json={
+            "user_id": user_id_grant,
+            "elem_id": elem_id,
+            "operation_name": operation_name
+        }
+    )
+    invalidate_viewable_elements(user_id=user_id_grant)
+    return parse(res)
+
+async def delete_element(user_id, elem_id):
+    res = await cerberus_client.post(
+        "/delete_element",
+        headers={"X-User-Id": user_id} if user_id else None,
+        json={"elem_id": elem_id}
+    )
+    invalidate_viewable_elements(elem_id=elem_id)
+    return parse(res)
+
+
+# =========================
+# Permission-filtered pagination
+# =========================
+
+async def search_permitted_experiments(is_permitted, max_results=MAX_RESULTS, page_token=None, filter=None, order_by=None, view_type="ACTIVE_ONLY", page_size=FILL_PAGE_SIZE, max_pages=FILL_MAX_PAGES):
+    # same pagination as the sync gateway; only the upstream calls are awaited here
+    pages = fill_permitted_pages(is_permitted, max_results, page_token, page_size, max_pages)
+    try:
+        request = next(pages)
+        while True:
+            request = pages.send(await search_experiments(*request, filter, order_by, view_type))
+    except StopIteration as done:
+        return done.value
+
+# =========================
+# Entity cache
+# =========================
+
+# same cache and eviction helpers as the sync gateway; background refreshes run as tasks
+refreshing = {}
+
+async def refresh_entity(key, load, generation):
+    try:
+        value = await load()
+        if isinstance(value, dict):
+            entity_cache.set(key, value, generation=generation)
+    except httpx.HTTPError:
+        pass
+    finally:
+        refreshing.pop(key, None)
+
+async def read_through(key, load):
+    value, fresh = entity_cache.lookup(key)
+    if fresh:
+        return value
+
+    generation = entity_cache.generation
+    if value is not MISSING:
+        if key not in refreshing:
+            refreshing[key] = asyncio.create_task(refresh_entity(key, load, generation))
+        return value
+
+    value = await load()
+    if isinstance(value, dict):
+        entity_cache.set(key, value, generation=generation)
+    return value
+
+
+# =========================
+# Experiments
+# =========================
+
+async def create_experiment(name, artifact_location=None, tags=None):
+    res = await client.post(
+        "/experiments/create",
+        json={
+            "name": name,
+            "artifact_location": artifact_location, 
+            "tags": tags
+        }
+    )
+    return parse(res)
+
+async def search_experiments(max_results=MAX_RESULTS, page_token=None, filter=None, order_by=None, view_type="ACTIVE_ONLY"):
+    res = await client.post(
+        "/experiments/search",
+        json={
+            "max_results": max_results, 
+            "page_token": page_token, 
+            "filter": filter, 
+            "order_by": order_by, 
+            "view_type": view_type
+        }
+    )
+    return parse(res)
+
+async def get_experiment(experiment_id):
+    async def load():
+        res = await client.get(
+            "/experiments/get",
+            params={"experiment_id": experiment_id}
+        )
+        return parse(res)
+    return await read_through(("experiment", str(experiment_id)), load)
+
+async def get_experiment_by_name(experiment_name):
+    res = await client.get(
+        "/experiments/get-by-name",
+        params={"experiment_name": experiment_name}
+    )
+    return parse(res)
+
+async def delete_experiment(experiment_id):
+    res = await client.post(
+        "/experiments/delete",
+        json={"experiment_id": experiment_id}
+    )
+    evict_experiment(experiment_id)
+    return parse(res)
+
+async def restore_experiment(experiment_id):
+    res = await client.post(
+        "/experiments/restore",
+        json={"experiment_id": experiment_id}
+    )
+    evict_experiment(experiment_id)
+    return parse(res)
+
+async def update_experiment(experiment_id, new_name):
+    res = await client.post(
+        "/experiments/update",
+        json={
+            "experiment_id": experiment_id, 
+            "new_name": new_name
+        }
+    )
+    evict_experiment(experiment_id)
+    return parse(res)
+
+async def set_experiment_tag(experiment_id, key, value):
+    res = await client.post(
+        "/experiments/set-experiment-tag",
+        json={
+            "experiment_id": experiment_id, 
+            "key": key, 
+            "value": value
+        }
+    )
+    evict_experiment(experiment_id)
+    return parse(res)
+
+async def delete_experiment_tag(experiment_id, key):
+    res = await client.post(
+        "/experiments/delete-experiment-tag",
+        json={
+            "experiment_id": experiment_id, 
+            "key": key
+        }
+    )
+    evict_experiment(experiment_id)
+    return parse(res)
+
+
+# =========================
+# Runs
+# =========================
+
+async def delete_run(run_id):
+    res = await client.post(
+        "/runs/delete",
+        json={"run_id": run_id}
+    )
+    evict_run(run_id)
+    return parse(res)
+
+async def restore_run(run_id):
+    res = await client.post(
+        "/runs/restore",
+        json={"run_id": run_id}
+    )
+    evict_run(run_id)
+    return parse(res)
+
+async def get_run(run_id):
+    async def load():
+        res = await client.get(
+            "/runs/get",
+            params={
+                "run_id": run_id
+            }
+        )
+        return parse(res)
+    return await read_through(("run", run_id), load)
+
+async def set_tag(run_id, key, value):
+    res = await client.post(
+        "/runs/set-tag",
+        json={
+            "run_id": run_id, 
+            "key": key, 
+            "value": value
+        }
+    )
+    evict_run(run_id)
+    return parse(res)
+
+async def delete_tag(run_id, key):
+    res = await client.post(
+        "/runs/delete-tag",
+        json={
+            "run_id": run_id, 
+            "key": key
+        }
+    )
+    evict_run(run_id)
+    return parse(res)
+
+async def get_metric_history(run_id, metric_key, max_results=MAX_RESULTS, raw=False):
+    res = await client.get(
+        "/metrics/get-history",
+        params={
+            "run_id": run_id, 
+            "metric_key": metric_key, 
+            "max_results": max_results
+        }
+    )
+    return res if raw else parse(res)
+
+async def search_runs(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = await client.post(
+        "/runs/search",
+        json={
+            "experiment_ids": experiment_ids, 
+            "filter": filter,
+            "run_view_type": run_view_type, 
+            "max_results": max_results, 
+            "order_by": order_by, 
+            "page_token": page_token
+        }
+    )
+    return res if raw else parse(res)
+
+async def update_run(run_id, status=None, end_time=None, run_name=None):
+    if status:
+        end_time = end_time if end_time else int(datetime.now().timestamp())
+    else:
+        end_time = None
+    res = await client.post(
+        "/runs/update",
+        json={
+            "run_id": run_id, 
+            "status": status,
+            "end_time": end_time, 
+            "run_name": run_name
+        }
+    )
+    evict_run(run_id)
+    return parse(res)
+
+# =========================
+# Models (Model Registry)
+# =========================
+
+async def create_registered_model(name, tags=None, description=None, deployment_job_id=None):
+    res = await client.post(
+        "/registered-models/create",
+        json={
+            "name": name,
+            "tags": tags,
+            "description": description,
+            "deployment_job_id": deployment_job_id
+        }
+    )
+    return parse(res)
+
+async def get_registered_model(name):
+    async def load():
+        res = await client.get(
+            "/registered-models/get",
+            params={"name": name}
+        )
+        return parse(res)
+    return await read_through(("model", name), load)
+
+async def rename_registered_model(name, new_name):
+    res = await client.post(
+        "/registered-models/rename",
+        json={
+            "name": name,
+            "new_name": new_name
+        }
+    )
+    evict_model(name)
+    evict_model(new_name)
+    return parse(res)
+
+async def update_registered_model(name, description=None, deployment_job_id=None):
+    res = await client.patch(
+        "/registered-models/update",
+        json={
+            "name": name,
+            "description": description,
+            "deployment_job_id": deployment_job_id
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def delete_registered_model(name):
+    res = await client.delete(
+        "/registered-models/delete",
+        json={"name": name}
+    )
+    evict_model(name)
+    return parse(res)
+
+async def search_registered_models(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = await client.get(
+        "/registered-models/search",
+        params={
+            "filter": filter,
+            "max_results": max_results,
+            "order_by": order_by,
+            "page_token": page_token
+        }
+    )
+    return res if raw else parse(res)
+
+async def set_registered_model_tag(name, key, value):
+    res = await client.post(
+        "/registered-models/set-tag",
+        json={
+            "name": name,
+            "key": key,
+            "value": value
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def delete_registered_model_tag(name, key):
+    res = await client.delete(
+        "/registered-models/delete-tag",
+        json={
+            "name": name,
+            "key": key
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def delete_registered_model_alias(name, alias):
+    res = await client.delete(
+        "/registered-models/alias",
+        json={
+            "name": name,
+            "alias": alias
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def set_registered_model_alias(name, alias, version):
+    res = await client.post(
+        "/registered-models/alias",
+        json={
+            "name": name,
+            "alias": alias,
+            "version": version
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+# =========================
+# Model Versions
+# =========================
+
+async def get_latest_model_versions(name, stages=None):
+    res = await client.post(
+        "/registered-models/get-latest-versions",
+        json={
+            "name": name,
+            "stages": stages
+        }
+    )
+    return parse(res)
+
+async def create_model_version(name, source, run_id=None, tags=None, run_link=None, description=None, model_id=None):
+    res = await client.post(
+        "/model-versions/create",
+        json={
+            "name": name,
+            "source": source,
+            "run_id": run_id,
+            "tags": tags,
+            "run_link": run_link,
+            "description": description,
+            "model_id": model_id
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def get_model_version(name, version):
+    async def load():
+        res = await client.get(
+            "/model-versions/get",
+            params={
+                "name": name,
+                "version": version
+            }
+        )
+        return parse(res)
+    return await read_through(("model_version", name, str(version)), load)
+
+async def update_model_version(name, version, description=None):
+    res = await client.patch(
+        "/model-versions/update",
+        json={
+            "name": name,
+            "version": version,
+            "description": description
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def delete_model_version(name, version):
+    res = await client.delete(
+        "/model-versions/delete",
+        json={
+            "name": name,
+            "version": version
+        }
+    )
+    evict_model(name)
+    model_cache.discard(name, version)
+    model_server.discard(name, version)
+    return parse(res)
+
+async def search_model_versions(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = await client.get(
+        "/model-versions/search",
+        params={
+            "filter": filter,
+            "max_results": max_results,
+            "order_by": order_by,
+            "page_token": page_token
+        }
+    )
+    return res if raw else parse(res)
+
+async def get_model_version_download_uri(name, version):
+    res = await client.get(
+        "/model-versions/get-download-uri",
+        params={
+            "name": name,
+            "version": version
+        }
+    )
+    return parse(res)
+
+async def transition_model_version_stage(name, version, stage, archive_existing_versions):
+    res = await client.post(
+        "/model-versions/transition-stage",
+        json={
+            "name": name,
+            "version": version,
+            "stage": stage,
+            "archive_existing_versions": archive_existing_versions
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def set_model_version_tag(name, version, key, value):
+    res = await client.post(
+        "/model-versions/set-tag",
+        json={
+            "name": name,
+            "version": version,
+            "key": key,
+            "value": value
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def delete_model_version_tag(name, version, key):
+    res = await client.delete(
+        "/model-versions/delete-tag",
+        json={
+            "name": name,
+            "version": version,
+            "key": key
+        }
+    )
+    evict_model(name)
+    return parse(res)
+
+async def get_model_version_by_alias(name, alias):
+    async def load():
+        res = await client.get(
+            "/registered-models/alias",
+            params={
+                "name": name,
+                "alias": alias
+            }
+        )
+        return parse(res)
+    return await read_through(("alias", name, alias), load)
+
+# =========================
+# Artifacts
+# =========================
+
+async def list_artifacts(run_id, path, page_token=None):
+    res = await client.get(
+        "/artifacts/list",
+        params={
+            "run_id": run_id, 
+            "path": path, 
+            "page_token": page_token
+        }
+    )
+    return parse(res)
\ No newline at end of file
@@ -0,0 +1,633 @@
+import asyncio
+from quart import Quart, request, jsonify, Response
+from quart.wrappers.response import DataBody
+from quart_cors import cors
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+import async_functions as afn
+import fastjson
+import httpx
+from functions import PASSTHROUGH, parse_max_results
+from main import CONDITIONAL_POST_ROUTES, etag_matches
+
+app = Quart(__name__)
+app.json = fastjson.ORJSONProvider(app)
+app = cors(app, expose_headers=["ETag"])
+
+
+@app.after_serving
+async def shutdown():
+    await afn.close_clients()
+
+
+def respond(res):
+    # same pass-through as main.respond
+    if isinstance(res, httpx.Response):
+        return Response(res.content, status=res.status_code, mimetype="application/json")
+    return jsonify(res)
+
+
+@app.after_request
+async def add_etag(response):
+    # same conditional responses as main.add_etag
+    if response.status_code != 200 or not isinstance(response.response, DataBody):
+        return response
+    if request.method not in ("GET", "HEAD") and not (request.method == "POST" and request.path in CONDITIONAL_POST_ROUTES):
+        return response
+
+    await response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("X-User-Id")
+
+    etag, _ = response.get_etag()
+    if etag_matches(etag, request.if_none_match):
+        not_modified = Response("", status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers["Cache-Control"] = "no-cache"
+        not_modified.vary.add("X-User-Id")
+        return not_modified
+    return response
+
+# =========================
+# Basic
+# =========================
+
+@app.route("/")
+async def index():
+    return jsonify({
+        "message": "Welcome to ML Studio",
+        "status": "Online",
+        "service": "heimdall"
+    })
+
+@app.route("/api/hello")
+async def hello():
+    return jsonify({"data": "Hello from ML Studio!"})
+
+# =========================
+# Experiments
+# =========================
+
+def permitted_experiment_filter(elem_ids, user_id):
+    dict_elem_ids = {k: v for k, v in sorted(elem_ids)}
+
+    def is_permitted(e):
+        return (int(e["experiment_id"]) in dict_elem_ids.keys()) and (e["lifecycle_stage"] != "delete" or dict_elem_ids[int(e["experiment_id"])] == user_id)
+
+    return is_permitted
+
+@app.route("/api/experiments/create", methods=["POST"])
+async def api_create_experiment():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    artifact_location = data.get("artifact_location")
+    tags = data.get("tags")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    res = await afn.create_experiment(name, artifact_location, tags)
+    return jsonify(res)
+
+@app.route("/api/experiments/search", methods=["POST"])
+async def api_search_experiments():
+    user_id = request.headers.get("X-User-Id")
+    data = await request.get_json() or {}
+
+    if data.get("fill_pages"):
+        # pages are pulled lazily, so only the ACL lookup is needed up front
+        elem_ids = await afn.get_viewable_elements(user_id, "experiment")
+        is_permitted = permitted_experiment_filter(elem_ids, user_id)
+        try:
+            max_results = parse_max_results(data.get("max_results"))
+        except ValueError:
+            return jsonify({"error": "'max_results' must be a positive integer"}), 400
+        try:
+            res = await afn.search_permitted_experiments(
+                is_permitted,
+                max_results=max_results,
+                page_token=data.get("page_token"),
+                filter=data.get("filter"),
+                order_by=data.get("order_by"),
+                view_type=data.get("view_type", "ACTIVE_ONLY")
+            )
+        except ValueError:
+            return jsonify({"error": "'page_token' is invalid"}), 400
+        return jsonify(res)
+
+    # the ACL lookup and the MLflow search are independent, so run them concurrently
+    elem_ids, res = await asyncio.gather(
+        afn.get_viewable_elements(user_id, "experiment"),
+        afn.search_experiments(
+            max_results=data.get("max_results", 500),
+            page_token=data.get("page_token"),
+            filter=data.get("filter"),
+            order_by=data.get("order_by"),
+            view_type=data.get("view_type", "ACTIVE_ONLY")
+        )
+    )
+    is_permitted = permitted_experiment_filter(elem_ids, user_id)
+
+    exp = res["experiments"]
+    res_final = [e for e in exp if is_permitted(e)]
+    return jsonify(res_final)
+
+@app.route("/api/experiments/get", methods=["GET"])
+async def api_get_experiment():
+    experiment_id = request.args.get("experiment_id")
+    if not experiment_id:
+        return jsonify({"error": "'experiment_id' is required"}), 400
+    res = await afn.get_experiment(experiment_id)
+    return jsonify(res)
+
+@app.route("/api/experiments/get-by-name", methods=["GET"])
+async def api_get_experiment_by_name():
+    experiment_name = request.args.get("experiment_name")
+    if not experiment_name:
+        return jsonify({"error": "'experiment_name' is required"}), 400
+    res = await afn.get_experiment_by_name(experiment_name)
+    return jsonify(res)
+
+@app.route("/api/experiments/delete", methods=["POST"])
+async def api_delete_experiment():
+    data = await request.get_json() or {}
+    experiment_id = data.get("experiment_id")
+    if not experiment_id:
+        return jsonify({"error": "'experiment_id' is required"}), 400
+    res = await afn.delete_experiment(experiment_id)
+    return jsonify(res)
+
+@app.route("/api/experiments/restore", methods=["POST"])
+async def api_restore_experiment():
+    data = await request.get_json() or {}
+    experiment_id = data.get("experiment_id")
+    if not experiment_id:
+        return jsonify({"error": "'experiment_id' is required"}), 400
+    res = await afn.restore_experiment(experiment_id)
+    return jsonify(res)
+
+@app.route("/api/experiments/update", methods=["POST"])
+async def api_update_experiment():
+    data = await request.get_json() or {}
+    experiment_id = data.get("experiment_id")
+    new_name = data.get("new_name")
+    if not experiment_id or not new_name:
+        return jsonify({"error": "'experiment_id' and 'new_name' are required"}), 400
+    res = await afn.update_experiment(experiment_id, new_name)
+    return jsonify(res)
+
+@app.route("/api/experiments/set-tag", methods=["POST"])
+async def api_set_experiment_tag():
+    data = await request.get_json() or {}
+    experiment_id = data.get("experiment_id")
+    key = data.get("key")
+    value = data.get("value")
+    if not experiment_id or not key or value is None:
+        return jsonify({"error": "'experiment_id', 'key', and 'value' are required"}), 400
+    res = await afn.set_experiment_tag(experiment_id, key, value)
+    return jsonify(res)
+
+@app.route("/api/experiments/delete-tag", methods=["POST"])
+async def api_delete_experiment_tag():
+    data = await request.get_json() or {}
+    experiment_id = data.get("experiment_id")
+    key = data.get("key")
+    if not experiment_id or not key:
+        return jsonify({"error": "'experiment_id' and 'key' are required"}), 400
+    res = await afn.delete_experiment_tag(experiment_id, key)
+    return jsonify(res)
+
+# =========================
+# Runs API
+# =========================
+
+@app.route("/api/runs/delete", methods=["POST"])
+async def api_delete_run():
+    data = await request.get_json() or {}
+    run_id = data.get("run_id")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    res = await afn.delete_run(run_id)
+    return jsonify(res)
+
+@app.route("/api/runs/restore", methods=["POST"])
+async def api_restore_run():
+    data = await request.get_json() or {}
+    run_id = data.get("run_id")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    res = await afn.restore_run(run_id)
+    return jsonify(res)
+
+@app.route("/api/runs/get", methods=["GET"])
+async def api_get_run():
+    run_id = request.args.get("run_id")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    res = await afn.get_run(run_id)
+    return jsonify(res)
+
+@app.route("/api/runs/set-tag", methods=["POST"])
+async def api_set_tag():
+    data = await request.get_json() or {}
+    run_id = data.get("run_id")
+    key = data.get("key")
+    value = data.get("value")
+    if not run_id or not key or value is None:
+        return jsonify({"error": "'run_id', 'key', and 'value' are required"}), 400
+    res = await afn.set_tag(run_id, key, value)
+    return jsonify(res)
+
+@app.route("/api/runs/delete-tag", methods=["POST"])
+async def api_delete_tag():
+    data = await request.get_json() or {}
+    run_id = data.get("run_id")
+    key = data.get("key")
+    if not run_id or not key:
+        return jsonify({"error": "'run_id' and 'key' are required"}), 400
+    res = await afn.delete_tag(run_id, key)
+    return jsonify(res)
+
+@app.route("/api/metrics/get-history", methods=["GET"])
+async def api_get_metric_history():
+    run_id = request.args.get("run_id")
+    metric_key = request.args.get("metric_key")
+    max_results = request.args.get("max_results", 500)
+    if not run_id or not metric_key:
+        return jsonify({"error": "'run_id' and 'metric_key' are required"}), 400
+    res = await afn.get_metric_history(run_id, metric_key, max_results, raw=PASSTHROUGH)
+    return respond(res)
+
+@app.route("/api/runs/search", methods=["POST"])
+async def api_search_runs():
+    data = await request.get_json() or {}
+    experiment_ids = data.get("experiment_ids")
+    if not experiment_ids:
+        return jsonify({"error": "'experiment_ids' is required"}), 400
+    res = await afn.search_runs(
+        experiment_ids=experiment_ids,
+        filter=data.get("filter"),
+        run_view_type=data.get("run_view_type", "ACTIVE_ONLY"),
+        max_results=data.get("max_results", 500),
+        order_by=data.get("order_by"),
+        page_token=data.get("page_token"),
+        raw=PASSTHROUGH
+    )
+    return respond(res)
+
+@app.route("/api/runs/update", methods=["POST"])
+async def api_update_run():
+    data = await request.get_json() or {}
+    run_id = data.get("run_id")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    res = await afn.update_run(
+        run_id=run_id,
+        status=data.get("status"),
+        end_time=data.get("end_time"),
+        run_name=data.get("run_name")
+    )
+    return jsonify(res)
+
+# =========================
+# Models API
+# =========================
+
+@app.route("/api/models/create", methods=["POST"])
+async def api_create_registered_model():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    
+    res = await afn.create_registered_model(
+        name=name,
+        tags=data.get("tags"),
+        description=data.get("description"),
+        deployment_job_id=data.get("deployment_job_id")
+    )
+    return jsonify(res)
+
+@app.route("/api/models/get", methods=["GET"])
+async def api_get_registered_model():
+    name = request.args.get("name")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    
+    res = await afn.get_registered_model(name)
+    return jsonify(res)
+
+@app.route("/api/models/rename", methods=["POST"])
+async def api_rename_registered_model():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    new_name = data.get("new_name")
+    if not name or not new_name:
+        return jsonify({"error": "'name' and 'new_name' are required"}), 400
+    
+    res = await afn.rename_registered_model(name, new_name)
+    return jsonify(res)
+
+@app.route("/api/models/update", methods=["PATCH"])
+async def api_update_registered_model():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    
+    res = await afn.update_registered_model(
+        name=name,
+        description=data.get("description"),
+        deployment_job_id=data.get("deployment_job_id")
+    )
+    return jsonify(res)
+
+@app.route("/api/models/delete", methods=["DELETE"])
+async def api_delete_registered_model():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    
+    res = await afn.delete_registered_model(name)
+    return jsonify(res)
+
+@app.route("/api/models/search", methods=["GET"])
+async def api_search_registered_models():
+    res = await afn.search_registered_models(
+        filter=request.args.get("filter"),
+        max_results=request.args.get("max_results", 500),
+        order_by=request.args.get("order_by"),
+        page_token=request.args.get("page_token"),
+        raw=PASSTHROUGH
+    )
+    return respond(res)
+
+@app.route("/api/models/set-tag", methods=["POST"])
+async def api_set_registered_model_tag():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    key = data.get("key")
+    value = data.get("value")
+    if not name or not key or value is None:
+        return jsonify({"error": "'name', 'key', and 'value' are required"}), 400
+    
+    res = await afn.set_registered_model_tag(name, key, value)
+    return jsonify(res)
+
+@app.route("/api/models/delete-tag", methods=["DELETE"])
+async def api_delete_registered_model_tag():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    key = data.get("key")
+    if not name or not key:
+        return jsonify({"error": "'name' and 'key' are required"}), 400
+    
+    res = await afn.delete_registered_model_tag(name, key)
+    return jsonify(res)
+
+@app.route("/api/models/alias", methods=["POST", "DELETE"])
+async def api_registered_model_alias():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    alias = data.get("alias")
+    
+    if not name or not alias:
+        return jsonify({"error": "'name' and 'alias' are required"}), 400
+    
+    if request.method == "POST":
+        version = data.get("version")
+        if not version:
+            return jsonify({"error": "'version' is required for setting an alias"}), 400
+        res = await afn.set_registered_model_alias(name, alias, version)
+    else:
+        res = await afn.delete_registered_model_alias(name, alias)
+        
+    return jsonify(res)
+
+# =========================
+# Model Versions API
+# =========================
+
+@app.route("/api/models/versions/latest", methods=["POST"])
+async def api_get_latest_model_versions():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    if not name:
+        return jsonify({"error": "'name' is required"}), 400
+    
+    res = await afn.get_latest_model_versions(name, data.get("stages"))
+    return jsonify(res)
+
+@app.route("/api/models/versions/create", methods=["POST"])
+async def api_create_model_version():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    source = data.get("source")
+    if not name or not source:
+        return jsonify({"error": "'name' and 'source' are required"}), 400
+    
+    res = await afn.create_model_version(
+        name=name,
+        source=source,
+        run_id=data.get("run_id"),
+        tags=data.get("tags"),
+        run_link=data.get("run_link"),
+        description=data.get("description"),
+        model_id=data.get("model_id")
+    )
+    return jsonify(res)
+
+@app.route("/api/models/versions/get", methods=["GET"])
+async def api_get_model_version():
+    name = request.args.get("name")
+    version = request.args.get("version")
+    if not name or not version:
+        return jsonify({"error": "'name' and 'version' are required"}), 400
+    
+    res = await afn.get_model_version(name, version)
+    return jsonify(res)
+
+@app.route("/api/models/versions/update", methods=["PATCH"])
+async def api_update_model_version():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    version = data.get("version")
+    if not name or not version:
+        return jsonify({"error": "'name' and 'version' are required"}), 400
+    
+    res = await afn.update_model_version(name, version, data.get("description"))
+    return jsonify(res)
+
+@app.route("/api/models/versions/delete", methods=["DELETE"])
+async def api_delete_model_version():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    version = data.get("version")
+    if not name or not version:
+        return jsonify({"error": "'name' and 'version' are required"}), 400
+    
+    res = await afn.delete_model_version(name, version)
+    return jsonify(res)
+
+@app.route("/api/models/versions/search", methods=["GET"])
+async def api_search_model_versions():
+    res = await afn.search_model_versions(
+        filter=request.args.get("filter"),
+        max_results=request.args.get("max_results", 500),
+        order_by=request.args.get("order_by"),
+        page_token=request.args.get("page_token"),
+        raw=PASSTHROUGH
+    )
+    return respond(res)
+
+@app.route("/api/models/versions/download-uri", methods=["GET"])
+async def api_get_model_version_download_uri():
+    name = request.args.get("name")
+    version = request.args.get("version")
+    if not name or not version:
+        return jsonify({"error": "'name' and 'version' are required"}), 400
+    
+    res = await afn.get_model_version_download_uri(name, version)
+    return jsonify(res)
+
+@app.route("/api/models/versions/transition", methods=["POST"])
+async def api_transition_model_version_stage():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    version = data.get("version")
+    stage = data.get("stage")
+    archive = data.get("archive_existing_versions", False)
+    if not name or not version or not stage:
+        return jsonify({"error": "'name', 'version', and 'stage' are required"}), 400
+    
+    res = await afn.transition_model_version_stage(name, version, stage, archive)
+    return jsonify(res)
+
+@app.route("/api/models/versions/set-tag", methods=["POST"])
+async def api_set_model_version_tag():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    version = data.get("version")
+    key = data.get("key")
+    value = data.get("value")
+    if not name or not version or not key or value is None:
+        return jsonify({"error": "'name', 'version', 'key', and 'value' are required"}), 400
+    
+    res = await afn.set_model_version_tag(name, version, key, value)
+    return jsonify(res)
+
+@app.route("/api/models/versions/delete-tag", methods=["DELETE"])
+async def api_delete_model_version_tag():
+    data = await request.get_json() or {}
+    name = data.get("name")
+    version = data.get("version")
+    key = data.get("key")
+    if not name or not version or not key:
+        return jsonify({"error": "'name', 'version', and 'key' are required"}), 400
+    
+    res = await afn.delete_model_version_tag(name, version, key)
+    return jsonify(res)
+
+@app.route("/api/models/versions/get-by-alias", methods=["GET"])
+async def api_get_model_version_by_alias():
+    name = request.args.get("name")
+    alias = request.args.get("alias")
+    if not name or not alias:
+        return jsonify({"error": "'name' and 'alias' are required"}), 400
+    
+    res = await afn.get_model_version_by_alias(name, alias)
+    return jsonify(res)
+
+# =========================
+# Artifacts API
+# =========================
+
+@app.route("/api/artifacts/list", methods=["GET"])
+async def api_list_artifacts():
+    run_id = request.args.get("run_id")
+    path = request.args.get("path", "")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    res = await afn.list_artifacts(run_id, path, request.args.get("page_token"))
+    return jsonify(res)
+
+# =========================
+# Access Control API
+# =========================
+
+@app.route("/api/elements/add", methods=["POST"])
+async def api_add_element():
+    user_id = request.headers.get("X-User-Id")
+    data = await request.get_json() or {}
+    component_name = data.get("component_name")
+    elem_name = data.get("elem_name")
+    if not component_name or not elem_name:
+        return jsonify({"error": "'component_name' and 'elem_name' are required"}), 400
+    res = await afn.add_element(user_id, data.get("elem_id"), component_name, elem_name)
+    return jsonify(res)
+
+@app.route("/api/elements/delete", methods=["POST"])
+async def api_delete_element():
+    user_id = request.headers.get("X-User-Id")
+    data = await request.get_json() or {}
+    elem_id = data.get("elem_id")
+    if not elem_id:
+        return jsonify({"error": "'elem_id' is required"}), 400
+    res = await afn.delete_element(user_id, elem_id)
+    return jsonify(res)
+
+@app.route("/api/permissions/edit", methods=["POST"])
+async def api_edit_user_permission():
+    user_id = request.headers.get("X-User-Id")
+    data = await request.get_json() or {}
+    user_id_grant = data.get("user_id")
+    elem_id = data.get("elem_id")
+    if not user_id_grant or not elem_id:
+        return jsonify({"error": "'user_id' and 'elem_id' are required"}), 400
+    res = await afn.edit_user_permission(user_id, user_id_grant, elem_id, data.get("operation_name"))
+    return jsonify(res)
+
+@app.route("/api/cache/stats", methods=["GET"])
+async def api_cache_stats():
+    return jsonify({
+        "viewable_elements": afn.viewable_cache.stats(),
+        "entities": afn.entity_cache.stats(),
+        "models": afn.model_cache.stats()
+    })
+
+# =========================
+# Main
+# =========================
+
+def handles(scope):
+    try:
+        app.url_map.bind("localhost").match(scope["path"], method=scope["method"])
+        return True
+    except HTTPException:
+        return False
+
+
+def build_gateway():
+    # routes without a native async handler (streaming, bulk and artifact endpoints)
+    # are served by the Flask app on asgiref's thread pool
+    import main as sync_main
+    fallback = WsgiToAsgi(sync_main.app)
+
+    async def gateway(scope, receive, send):
+        if scope["type"] == "http" and not handles(scope):
+            await fallback(scope, receive, send)
+        else:
+            await app(scope, receive, send)
+
+    return gateway
+
+
+def run(host="0.0.0.0", port=5000):
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    asyncio.run(serve(build_gateway(), config))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,97 @@
+import time
+import threading
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class TTLCache:
+    # thread-safe LRU map whose entries also expire after `ttl` seconds;
+    # the lock is never held across I/O so it is safe to share with the asyncio gateway.
+    # With stale_ttl > 0 an expired entry is kept that much longer so callers can
+    # serve it while they revalidate (see lookup).
+    # `sync`, when set, runs before every lookup to apply evictions made by other processes.
+    def __init__(self, maxsize=1024, ttl=60, stale_ttl=0, sync=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.sync = sync
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        # bumped by every invalidation; a load that started before an invalidation
+        # passes the generation it saw to set() and is dropped instead of caching old data
+        self.generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key):
+        # returns (value, fresh); value is MISSING on a miss
+        if self.sync is not None:
+            self.sync()
+        with self.lock:
+            entry = self.data.get(key, MISSING)
+            now = time.monotonic()
+            if entry is MISSING or entry[0] + self.stale_ttl <= now:
+                if entry is not MISSING:
+                    del self.data[key]
+                    self.evictions += 1
+                self.misses += 1
+                return MISSING, False
+            self.data.move_to_end(key)
+            if entry[0] > now:
+                self.hits += 1
+                return entry[1], True
+            self.stale_hits += 1
+            return entry[1], False
+
+    def get(self, key, default=None):
+        value, fresh = self.lookup(key)
+        return value if fresh else default
+
+    def set(self, key, value, ttl=None, generation=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self.data[key] = (expires_at, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, key):
+        with self.lock:
+            self.generation += 1
+            return self.data.pop(key, MISSING) is not MISSING
+
+    def invalidate_matching(self, predicate):
+        # predicate(key, value) -> bool
+        with self.lock:
+            self.generation += 1
+            keys = [k for k, (_, v) in self.data.items() if predicate(k, v)]
+            for k in keys:
+                del self.data[k]
+        return len(keys)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.data.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self.data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,130 @@
+import json
+import struct
+import numpy as np
+import pyarrow as pa
+from downsample import to_arrays
+
+# Binary metric series layout (all little-endian):
+#   uint32 header length | JSON header, space-padded so the data starts 8-byte aligned | data
+# For every series the data section holds `count` float64 steps, then timestamps, then values,
+# starting at the series' byte `offset` into the data section. Clients can view it with Float64Array.
+BINARY_MIMETYPE = "application/vnd.mlstudio.metrics+octet-stream"
+SERIES_LAYOUT = ["step", "timestamp", "value"]
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+RUN_INFO_COLUMNS = ["run_name", "experiment_id", "status", "start_time", "end_time", "lifecycle_stage"]
+
+
+def json_floats(values):
+    # NaN/inf are not valid JSON
+    return [v if np.isfinite(v) else None for v in values.tolist()]
+
+
+def metric_series_json(results):
+    series = []
+    for run_id, metric_key, metrics, error in results:
+        step, timestamp, value = to_arrays(metrics, drop_non_finite=False)
+        entry = {
+            "run_id": run_id,
+            "metric_key": metric_key,
+            "count": len(value),
+            "step": step.tolist(),
+            "timestamp": timestamp.tolist(),
+            "value": json_floats(value)
+        }
+        if error:
+            entry["error"] = error
+        series.append(entry)
+    return {"series": series}
+
+
+def metric_series_binary(results):
+    entries, blocks = [], []
+    offset = 0
+    for run_id, metric_key, metrics, error in results:
+        step, timestamp, value = to_arrays(metrics, drop_non_finite=False)
+        block = np.concatenate([step.astype("<f8"), timestamp.astype("<f8"), value.astype("<f8")]).tobytes()
+        entry = {"run_id": run_id, "metric_key": metric_key, "count": len(value), "offset": offset}
+        if error:
+            entry["error"] = error
+        entries.append(entry)
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({"dtype": "<f8", "layout": SERIES_LAYOUT, "series": entries}).encode()
+    header += b" " * (-(4 + len(header)) % 8)
+    return b"".join([struct.pack("<I", len(header)), header] + blocks)
+
+
+# =========================
+# Run comparison frames
+# =========================
+
+def to_float(value):
+    # MLflow encodes non-finite doubles as "NaN" / "Infinity" strings
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def run_to_row(run):
+    info = run.get("info", {})
+    data = run.get("data", {})
+    row = {name: info.get(name) for name in RUN_INFO_COLUMNS}
+    for p in data.get("params", []):
+        row[f"params.{p['key']}"] = p.get("value")
+    for m in data.get("metrics", []):
+        row[f"metrics.{m['key']}"] = to_float(m.get("value"))
+    for t in data.get("tags", []):
+        row[f"tags.{t['key']}"] = t.get("value")
+    return info.get("run_id"), row
+
+
+def pivot_runs(run_pages, columns=None, max_runs=None):
+    # one row per run, one column per info field / param / metric / tag key;
+    # `columns` projects the frame onto the given names; run_id is always the index, never a column
+    if columns is not None:
+        columns = [c for c in columns if c != "run_id"]
+    index, rows = [], []
+    for page in run_pages:
+        for run in page:
+            run_id, row = run_to_row(run)
+            index.append(run_id)
+            rows.append(row if columns is None else {c: row.get(c) for c in columns})
+            if max_runs is not None and len(index) > max_runs:
+                raise ValueError(f"More than {max_runs} runs match the query")
+
+    if columns is None:
+        keys = set().union(*rows) - set(RUN_INFO_COLUMNS) if rows else set()
+        columns = RUN_INFO_COLUMNS + sorted(keys)
+
+    return index, {c: [row.get(c) for row in rows] for c in columns}
+
+
+def runs_frame_json(index, frame):
+    return {
+        "count": len(index),
+        "index": index,
+        "columns": {
+            name: [v if not isinstance(v, float) or np.isfinite(v) else None for v in values]
+            for name, values in frame.items()
+        }
+    }
+
+
+def runs_frame_arrow(index, frame):
+    arrays = {"run_id": pa.array(index, type=pa.string())}
+    for name, values in frame.items():
+        if name.startswith("metrics."):
+            arrays[name] = pa.array(values, type=pa.float64())
+        elif name in ("start_time", "end_time"):
+            arrays[name] = pa.array([int(v) if v is not None else None for v in values], type=pa.int64())
+        else:
+            arrays[name] = pa.array([str(v) if v is not None else None for v in values], type=pa.string())
+
+    table = pa.table(arrays)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,99 @@
+import numpy as np
+
+MODES = ("lttb", "buckets")
+
+
+def to_arrays(metrics, drop_non_finite=True):
+    # metric points -> (step, timestamp, value) arrays sorted by step
+    step = np.fromiter((m.get("step", 0) for m in metrics), dtype=np.int64, count=len(metrics))
+    timestamp = np.fromiter((m.get("timestamp", 0) for m in metrics), dtype=np.int64, count=len(metrics))
+    value = np.fromiter((m.get("value", np.nan) for m in metrics), dtype=np.float64, count=len(metrics))
+
+    if drop_non_finite:
+        finite = np.isfinite(value)
+        step, timestamp, value = step[finite], timestamp[finite], value[finite]
+
+    order = np.lexsort((timestamp, step))
+    return step[order], timestamp[order], value[order]
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets; returns the indices of the selected points
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=np.int64)
+
+    x = x.astype(np.float64)
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+def bucket_stats(y, n_buckets):
+    # equal-count buckets; returns (starts, counts, min, max, mean)
+    n = len(y)
+    n_buckets = max(min(n_buckets, n), 1)
+    if n == 0:
+        empty = np.array([], dtype=np.float64)
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64), empty, empty, empty
+
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    return (
+        starts,
+        counts,
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(y, starts),
+        np.add.reduceat(y, starts) / counts
+    )
+
+
+def downsample(metrics, n_points, mode="lttb"):
+    step, timestamp, value = to_arrays(metrics)
+    res = {
+        "mode": mode,
+        "total_points": len(metrics),
+        "dropped_points": len(metrics) - len(value)
+    }
+
+    if mode == "lttb":
+        idx = lttb(step, value, n_points)
+        res.update({
+            "points": len(idx),
+            "step": step[idx].tolist(),
+            "timestamp": timestamp[idx].tolist(),
+            "value": value[idx].tolist()
+        })
+    else:
+        starts, counts, mins, maxs, means = bucket_stats(value, n_points)
+        res.update({
+            "points": len(starts),
+            "step": step[starts].tolist(),
+            "step_end": step[starts + counts - 1].tolist(),
+            "count": counts.tolist(),
+            "min": mins.tolist(),
+            "max": maxs.tolist(),
+            "mean": means.tolist()
+        })
+
+    return res
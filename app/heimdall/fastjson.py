@@ -0,0 +1,42 @@
+import decimal
+import orjson
+from flask.json.provider import JSONProvider
+
+OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def default(obj):
+    # types orjson does not cover natively but Flask's default provider does
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    return orjson.dumps(obj, default=default, option=OPTIONS)
+
+
+def loads(s):
+    return orjson.loads(s)
+
+
+def parse(res):
+    # MLflow/Cerberus response -> parsed body on 200, raw text otherwise
+    return loads(res.content) if res.status_code == 200 else res.text
+
+
+class ORJSONProvider(JSONProvider):
+    # serves jsonify() and request.json through orjson; works for both the Flask and Quart apps
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
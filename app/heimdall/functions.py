@@ -1,7 +1,27 @@
+import os
+import json
+import base64
 import requests
+import importlib.util
+import threading
 from datetime import datetime
+from urllib.parse import urlparse, quote
+from fnmatch import fnmatchcase
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache import TTLCache, MISSING
+from invalidation import InvalidationLog
+from uploads import UploadStore
+from model_cache import ModelCache
+from serving import ModelServer
+import fastjson
+from fastjson import parse
 
-url = "http://mlflow:5000/api/2.0/mlflow"
+url = os.getenv("MLFLOW_URL", "http://mlflow:5000/api/2.0/mlflow")
+cerberus_url = os.getenv("CERBERUS_URL", "http://ml-studio-web-1:5000/api")
+# MLflow's artifact proxy (mlflow server --serve-artifacts)
+artifacts_url = os.getenv("MLFLOW_ARTIFACTS_URL", url.rsplit("/mlflow", 1)[0] + "/mlflow-artifacts")
 headers = {
     "Content-Type": "application/json",
     "Host": "localhost"
@@ -9,27 +29,306 @@ headers = {
 
 MAX_RESULTS = 500
 
+POOL_SIZE = int(os.getenv("MLFLOW_POOL_SIZE", "32"))
+TIMEOUT = float(os.getenv("MLFLOW_TIMEOUT", "10"))
+MAX_RETRIES = int(os.getenv("MLFLOW_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("MLFLOW_BACKOFF_FACTOR", "0.3"))
+
+FILL_PAGE_SIZE = int(os.getenv("EXPERIMENT_SEARCH_PAGE_SIZE", "1000"))
+FILL_MAX_PAGES = int(os.getenv("EXPERIMENT_SEARCH_MAX_PAGES", "20"))
+FILL_MAX_RESULTS = int(os.getenv("EXPERIMENT_SEARCH_MAX_RESULTS", "5000"))
+
+METRIC_HISTORY_PAGE_SIZE = int(os.getenv("METRIC_HISTORY_PAGE_SIZE", "25000"))
+RUN_SEARCH_PAGE_SIZE = int(os.getenv("RUN_SEARCH_PAGE_SIZE", "1000"))
+BULK_FETCH_WORKERS = int(os.getenv("BULK_FETCH_WORKERS", "16"))
+# series one bulk history request may have in flight at once; the rest of the pool stays free for other requests
+BULK_REQUEST_CONCURRENCY = int(os.getenv("BULK_REQUEST_CONCURRENCY", "4"))
+
+CERBERUS_TIMEOUT = float(os.getenv("CERBERUS_TIMEOUT", "5"))
+VIEWABLE_CACHE_SIZE = int(os.getenv("VIEWABLE_CACHE_SIZE", "4096"))
+VIEWABLE_CACHE_TTL = float(os.getenv("VIEWABLE_CACHE_TTL", "30"))
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "2048"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "30"))
+# > 0 enables stale-while-revalidate for that many seconds past the TTL
+ENTITY_CACHE_STALE_TTL = float(os.getenv("ENTITY_CACHE_STALE_TTL", "0"))
+
+# downloads hold their connection for the whole transfer, so they get their own pool
+ARTIFACT_POOL_SIZE = int(os.getenv("ARTIFACT_POOL_SIZE", "16"))
+ARTIFACT_TIMEOUT = float(os.getenv("ARTIFACT_TIMEOUT", "60"))
+ARTIFACT_TREE_WORKERS = int(os.getenv("ARTIFACT_TREE_WORKERS", "8"))
+ARTIFACT_TREE_MAX_FILES = int(os.getenv("ARTIFACT_TREE_MAX_FILES", "100000"))
+# read timeout for forwarding a finished upload; MLflow may take a while to persist a large body
+UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "600"))
+UPLOAD_TTL = float(os.getenv("UPLOAD_TTL", str(24 * 3600)))
+MODEL_CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+# loaded models are held in memory per worker; requests to one version are scored together
+SERVING_MAX_MODELS = int(os.getenv("SERVING_MAX_MODELS", "4"))
+PREDICT_MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "256"))
+PREDICT_MAX_WAIT = float(os.getenv("PREDICT_MAX_WAIT_MS", "5")) / 1000
+
+# forward MLflow's response bytes and status unchanged on routes that do not filter the result
+PASSTHROUGH = os.getenv("HEIMDALL_PASSTHROUGH", "0") == "1"
+
+
+# =========================
+# Client
+# =========================
+
+class MLflowClient:
+    # only verbs that are safe to replay are retried on read errors and 5xx;
+    # connection errors are retried for every verb since nothing was sent yet
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+    def __init__(self, base_url=url, pool_size=POOL_SIZE, timeout=TIMEOUT, max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, default_headers=headers):
+        self.base_url = base_url
+        self.timeout = timeout
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=self.IDEMPOTENT_METHODS,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+
+        # a single Session is shared by all Flask worker threads; requests/urllib3
+        # hand out one pooled connection per in-flight request, so the pool size
+        # bounds the number of concurrent upstream calls
+        self.session = requests.Session()
+        if default_headers:
+            self.session.headers.update(default_headers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, path, timeout=None, **kwargs):
+        return self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            timeout=timeout or self.timeout,
+            **kwargs
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+client = MLflowClient()
+# run page prefetch and stale-entity refreshes
+fetch_executor = ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS, thread_name_prefix="mlflow-fetch")
+# bulk metric history fan-out only, so large bulk requests never delay prefetches or refreshes
+bulk_executor = ThreadPoolExecutor(max_workers=BULK_FETCH_WORKERS, thread_name_prefix="mlflow-bulk")
+cerberus_client = MLflowClient(base_url=cerberus_url, timeout=CERBERUS_TIMEOUT, default_headers=None)
+# no automatic retries: the request body is a one-shot stream, and a failed upload is retried by the caller
+upload_client = MLflowClient(base_url=artifacts_url, pool_size=ARTIFACT_POOL_SIZE, timeout=UPLOAD_TIMEOUT, max_retries=0, default_headers={"Host": "localhost"})
+upload_store = UploadStore(os.getenv("UPLOAD_DIR"), ttl=UPLOAD_TTL)
+# directory listings for walk_artifacts; kept apart from fetch_executor so a large tree cannot starve bulk fetches
+tree_executor = ThreadPoolExecutor(max_workers=ARTIFACT_TREE_WORKERS, thread_name_prefix="artifact-tree")
+artifact_client = MLflowClient(base_url=artifacts_url, pool_size=ARTIFACT_POOL_SIZE, timeout=ARTIFACT_TIMEOUT, default_headers={"Host": "localhost"})
+
+def clear_caches():
+    viewable_cache.clear()
+    entity_cache.clear()
+
+# every gunicorn worker has its own caches; evictions reach the other workers through this log
+invalidations = InvalidationLog(
+    os.getenv("INVALIDATION_LOG"),
+    handlers={
+        "viewable": lambda *args: invalidate_viewable_elements(*args, publish=False),
+        "experiment": lambda experiment_id: evict_experiment(experiment_id, publish=False),
+        "run": lambda run_id: evict_run(run_id, publish=False),
+        "model": lambda name: evict_model(name, publish=False)
+    },
+    on_reset=clear_caches
+)
+# (user_id, comp_name) -> elem_ids as returned by Cerberus /get_viewable_elements
+viewable_cache = TTLCache(maxsize=VIEWABLE_CACHE_SIZE, ttl=VIEWABLE_CACHE_TTL, sync=invalidations.sync)
+entity_cache = TTLCache(maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL, stale_ttl=ENTITY_CACHE_STALE_TTL, sync=invalidations.sync)
+invalidations.sync()
+refreshing = set()
+refresh_lock = threading.Lock()
+
+
+# =========================
+# Cerberus
+# =========================
+
+def get_viewable_elements(user_id, comp_name):
+    key = (user_id, comp_name)
+    elem_ids = viewable_cache.get(key)
+    if elem_ids is not None:
+        return elem_ids
+
+    generation = viewable_cache.generation
+    res = cerberus_client.get(
+        "/get_viewable_elements",
+        headers={"X-User-Id": user_id},
+        params={"comp_name": comp_name}
+    )
+    res.raise_for_status()
+    elem_ids = fastjson.loads(res.content)["elem_ids"]
+    viewable_cache.set(key, elem_ids, generation=generation)
+    return elem_ids
+
+def invalidate_viewable_elements(user_id=None, comp_name=None, elem_id=None, publish=True):
+    # drop every cached set that could be affected by a permission change
+    if publish:
+        invalidations.publish("viewable", user_id, comp_name, elem_id)
+    def affected(key, elem_ids):
+        if user_id is not None and key[0] != str(user_id):
+            return False
+        if comp_name is not None and key[1] != comp_name:
+            return False
+        if elem_id is not None and not any(str(r[0]) == str(elem_id) for r in elem_ids):
+            return False
+        return True
+    return viewable_cache.invalidate_matching(affected)
+
+def has_permission(user_id, elem_id, operation_name):
+    res = cerberus_client.get(
+        "/user_permission",
+        headers={"X-User-Id": user_id},
+        params={"elem_id": elem_id, "operation_name": operation_name}
+    )
+    res.raise_for_status()
+    return fastjson.loads(res.content)["has_permission"]
+
+def has_model_permission(user_id, name, operation_name):
+    # registered models are Cerberus "model" elements named after the model
+    res = cerberus_client.get(
+        "/user_permission",
+        headers={"X-User-Id": user_id},
+        params={"comp_name": "model", "elem_name": name, "operation_name": operation_name}
+    )
+    res.raise_for_status()
+    return fastjson.loads(res.content)["has_permission"]
+
+def add_element(user_id, elem_id, component_name, elem_name):
+    res = cerberus_client.post(
+        "/add_element",
+        headers={"X-User-Id": user_id},
+        json={
+            "elem_id": elem_id,
+            "component_name": component_name,
+            "elem_name": elem_name
+        }
+    )
+    invalidate_viewable_elements(user_id=user_id, comp_name=component_name)
+    return parse(res)
+
+def edit_user_permission(user_id, user_id_grant, elem_id, operation_name):
+    res = cerberus_client.post(
+        "/edit_user_permission",
+        headers={"X-User-Id": user_id},
+        json={
+            "user_id": user_id_grant,
+            "elem_id": elem_id,
+            "operation_name": operation_name
+        }
+    )
+    invalidate_viewable_elements(user_id=user_id_grant)
+    return parse(res)
+
+def delete_element(user_id, elem_id):
+    res = cerberus_client.post(
+        "/delete_element",
+        headers={"X-User-Id": user_id},
+        json={"elem_id": elem_id}
+    )
+    invalidate_viewable_elements(elem_id=elem_id)
+    return parse(res)
+
+
+# =========================
+# Entity cache
+# =========================
+
+# get_* lookups for experiments, runs and models are served from entity_cache;
+# every write through heimdall evicts the entity it touched.
+# Only successful (dict) responses are cached, errors always go to MLflow.
+
+MODEL_ENTITIES = ("model", "model_version", "alias")
+
+def refresh_entity(key, load, generation):
+    try:
+        value = load()
+        if isinstance(value, dict):
+            entity_cache.set(key, value, generation=generation)
+    except requests.RequestException:
+        pass
+    finally:
+        with refresh_lock:
+            refreshing.discard(key)
+
+def read_through(key, load):
+    value, fresh = entity_cache.lookup(key)
+    if fresh:
+        return value
+
+    generation = entity_cache.generation
+    if value is not MISSING:
+        # stale-while-revalidate: answer with the stale copy and refresh it once in the background
+        with refresh_lock:
+            if key not in refreshing:
+                refreshing.add(key)
+                fetch_executor.submit(refresh_entity, key, load, generation)
+        return value
+
+    value = load()
+    if isinstance(value, dict):
+        entity_cache.set(key, value, generation=generation)
+    return value
+
+def evict_experiment(experiment_id, publish=True):
+    entity_cache.invalidate(("experiment", str(experiment_id)))
+    if publish:
+        invalidations.publish("experiment", experiment_id)
+
+def evict_run(run_id, publish=True):
+    entity_cache.invalidate(("run", run_id))
+    if publish:
+        invalidations.publish("run", run_id)
+
+def evict_model(name, publish=True):
+    # a model, its versions and its aliases are evicted together
+    entity_cache.invalidate_matching(lambda key, value: key[0] in MODEL_ENTITIES and key[1] == name)
+    if publish:
+        invalidations.publish("model", name)
+
 
 # =========================
 # Experiments
 # =========================
 
 def create_experiment(name, artifact_location=None, tags=None):
-    res = requests.post(
-        f"{url}/experiments/create",
-        headers=headers,
+    res = client.post(
+        "/experiments/create",
         json={
             "name": name,
             "artifact_location": artifact_location, 
             "tags": tags
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def search_experiments(max_results=MAX_RESULTS, page_token=None, filter=None, order_by=None, view_type="ACTIVE_ONLY"):
-    res = requests.post(
-        f"{url}/experiments/search",
-        headers=headers,
+    res = client.post(
+        "/experiments/search",
         json={
             "max_results": max_results, 
             "page_token": page_token, 
@@ -38,143 +337,273 @@ def search_experiments(max_results=MAX_RESULTS, page_token=None, filter=None, or
             "view_type": view_type
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def get_experiment(experiment_id):
-    res = requests.get(
-        f"{url}/experiments/get", 
-        headers=headers, 
-        params={"experiment_id": experiment_id}
-    )
-    return res.json() if res.status_code == 200 else res.text
+    def load():
+        res = client.get(
+            "/experiments/get",
+            params={"experiment_id": experiment_id}
+        )
+        return parse(res)
+    return read_through(("experiment", str(experiment_id)), load)
 
 def get_experiment_by_name(experiment_name):
-    res = requests.get(
-        f"{url}/experiments/get-by-name", 
-        headers=headers, 
+    res = client.get(
+        "/experiments/get-by-name",
         params={"experiment_name": experiment_name}
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def delete_experiment(experiment_id):
-    res = requests.post(
-        f"{url}/experiments/delete", 
-        headers=headers, 
+    res = client.post(
+        "/experiments/delete",
         json={"experiment_id": experiment_id}
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_experiment(experiment_id)
+    return parse(res)
 
 def restore_experiment(experiment_id):
-    res = requests.post(
-        f"{url}/experiments/restore", 
-        headers=headers, 
+    res = client.post(
+        "/experiments/restore",
         json={"experiment_id": experiment_id}
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_experiment(experiment_id)
+    return parse(res)
 
 def update_experiment(experiment_id, new_name):
-    res = requests.post(
-        f"{url}/experiments/update", 
-        headers=headers, 
+    res = client.post(
+        "/experiments/update",
         json={
             "experiment_id": experiment_id, 
             "new_name": new_name
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_experiment(experiment_id)
+    return parse(res)
 
 def set_experiment_tag(experiment_id, key, value):
-    res = requests.post(
-        f"{url}/experiments/set-experiment-tag", 
-        headers=headers, 
+    res = client.post(
+        "/experiments/set-experiment-tag",
         json={
             "experiment_id": experiment_id, 
             "key": key, 
             "value": value
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_experiment(experiment_id)
+    return parse(res)
 
 def delete_experiment_tag(experiment_id, key):
-    res = requests.post(
-        f"{url}/experiments/delete-experiment-tag", 
-        headers=headers, 
+    res = client.post(
+        "/experiments/delete-experiment-tag",
         json={
             "experiment_id": experiment_id, 
             "key": key
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_experiment(experiment_id)
+    return parse(res)
+
+# =========================
+# Permission-filtered pagination
+# =========================
+
+def encode_page_token(page_token, offset, page_size):
+    # composite token: upstream MLflow page token + position inside that page;
+    # the upstream page size is pinned so the offset stays meaningful
+    raw = json.dumps({"t": page_token, "o": offset, "n": page_size}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_page_token(token):
+    if token is None or token == "":
+        return None, 0, None
+    if not isinstance(token, str):
+        raise ValueError("malformed page token")
+    data = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(data, dict) or not isinstance(data.get("o"), int) or not isinstance(data.get("n"), int):
+        raise ValueError("malformed page token")
+    # tokens are only ever issued with the configured page size
+    if data["o"] < 0 or not 0 < data["n"] <= FILL_PAGE_SIZE:
+        raise ValueError("malformed page token")
+    return data.get("t"), data["o"], data["n"]
+
+def parse_max_results(value, default=MAX_RESULTS, limit=FILL_MAX_RESULTS):
+    # -> an int between 1 and limit; anything that is not a positive integer raises ValueError
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    value = int(value)
+    if value < 1:
+        raise ValueError(value)
+    return min(value, limit)
+
+def fill_page(page, offset, is_permitted, results, max_results):
+    # returns the index to resume from when the page filled up, otherwise None
+    for i in range(offset, len(page)):
+        if is_permitted(page[i]):
+            results.append(page[i])
+            if len(results) == max_results:
+                return i + 1
+    return None
+
+def next_fill_token(page_token, next_page_token, resume_at, page_len, page_size):
+    if resume_at is not None and resume_at < page_len:
+        return encode_page_token(page_token, resume_at, page_size)
+    return encode_page_token(next_page_token, 0, page_size) if next_page_token else None
+
+def fill_permitted_pages(is_permitted, max_results, page_token, page_size, max_pages):
+    # The pagination of search_permitted_experiments without any I/O, shared with the async gateway:
+    # yields (page_size, upstream page token) for every upstream page it needs, is sent the
+    # search_experiments response for it, and returns the result through StopIteration.
+    upstream_token, offset, token_page_size = decode_page_token(page_token)
+    page_size = token_page_size or page_size
+    results = []
+
+    # at most max_pages upstream calls per request; a short page with a token
+    # is returned if the budget runs out before max_results are found
+    for _ in range(max_pages):
+        res = yield page_size, upstream_token
+        if not isinstance(res, dict):
+            return res
+        page = res.get("experiments", [])
+        next_page_token = res.get("next_page_token")
+
+        resume_at = fill_page(page, offset, is_permitted, results, max_results)
+        if resume_at is not None or not next_page_token:
+            return {
+                "experiments": results,
+                "next_page_token": next_fill_token(upstream_token, next_page_token, resume_at, len(page), page_size)
+            }
+        upstream_token, offset = next_page_token, 0
+
+    return {
+        "experiments": results,
+        "next_page_token": encode_page_token(upstream_token, 0, page_size)
+    }
+
+def search_permitted_experiments(is_permitted, max_results=MAX_RESULTS, page_token=None, filter=None, order_by=None, view_type="ACTIVE_ONLY", page_size=FILL_PAGE_SIZE, max_pages=FILL_MAX_PAGES):
+    pages = fill_permitted_pages(is_permitted, max_results, page_token, page_size, max_pages)
+    try:
+        request = next(pages)
+        while True:
+            request = pages.send(search_experiments(*request, filter, order_by, view_type))
+    except StopIteration as done:
+        return done.value
 
 # =========================
 # Runs
 # =========================
 
 def delete_run(run_id):
-    res = requests.post(
-        f"{url}/runs/delete", 
-        headers=headers, 
+    res = client.post(
+        "/runs/delete",
         json={"run_id": run_id}
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_run(run_id)
+    return parse(res)
 
 def restore_run(run_id):
-    res = requests.post(
-        f"{url}/runs/restore", 
-        headers=headers, 
+    res = client.post(
+        "/runs/restore",
         json={"run_id": run_id}
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_run(run_id)
+    return parse(res)
 
 def get_run(run_id):
-    res = requests.get(
-        f"{url}/runs/get", 
-        headers=headers, 
-        params={
-            "run_id": run_id
-        }
-    )
-    return res.json() if res.status_code == 200 else res.text
+    def load():
+        res = client.get(
+            "/runs/get",
+            params={
+                "run_id": run_id
+            }
+        )
+        return parse(res)
+    return read_through(("run", run_id), load)
 
 def set_tag(run_id, key, value):
-    res = requests.post(
-        f"{url}/runs/set-tag", 
-        headers=headers, 
+    res = client.post(
+        "/runs/set-tag",
         json={
             "run_id": run_id, 
             "key": key, 
             "value": value
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_run(run_id)
+    return parse(res)
 
 def delete_tag(run_id, key):
-    res = requests.post(
-        f"{url}/runs/delete-tag", 
-        headers=headers, 
+    res = client.post(
+        "/runs/delete-tag",
         json={
             "run_id": run_id, 
             "key": key
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_run(run_id)
+    return parse(res)
 
-def get_metric_history(run_id, metric_key, max_results=MAX_RESULTS):
-    res = requests.get(
-        f"{url}/metrics/get-history", 
-        headers=headers, 
+def get_metric_history(run_id, metric_key, max_results=MAX_RESULTS, page_token=None, raw=False):
+    res = client.get(
+        "/metrics/get-history",
         params={
             "run_id": run_id, 
             "metric_key": metric_key, 
-            "max_results": max_results
+            "max_results": max_results,
+            "page_token": page_token
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return res if raw else parse(res)
+
+def iter_metric_history(run_id, metric_key, page_size=METRIC_HISTORY_PAGE_SIZE):
+    # yields one upstream page of metrics at a time, so callers hold at most one page in memory
+    page_token = None
+    while True:
+        res = get_metric_history(run_id, metric_key, page_size, page_token)
+        if not isinstance(res, dict):
+            raise requests.HTTPError(res)
+        yield res.get("metrics", [])
+        page_token = res.get("next_page_token")
+        if not page_token:
+            return
+
+def collect_metric_history(run_id, metric_key):
+    return [m for page in iter_metric_history(run_id, metric_key) for m in page]
 
-def search_runs(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", max_results=MAX_RESULTS, order_by=None, page_token=None):
-    res = requests.post(
-        f"{url}/runs/search",
-        headers=headers,
+def get_metric_histories(pairs, concurrency=BULK_REQUEST_CONCURRENCY):
+    # fans (run_id, metric_key) pairs out over bulk_executor, keeping at most `concurrency` of them
+    # in flight per request so one large request cannot queue ahead of everyone else's;
+    # returns [(run_id, metric_key, metrics, error)] in input order
+    results = [None] * len(pairs)
+    queued = iter(enumerate(pairs))
+    pending = {}
+
+    def submit_next():
+        for i, (run_id, metric_key) in queued:
+            pending[bulk_executor.submit(collect_metric_history, run_id, metric_key)] = i
+            return
+
+    for _ in range(concurrency):
+        submit_next()
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = pending.pop(future)
+            run_id, metric_key = pairs[i]
+            try:
+                results[i] = (run_id, metric_key, future.result(), None)
+            except (requests.RequestException, ValueError) as e:
+                # ValueError: an upstream body that is not valid JSON fails only its own series
+                results[i] = (run_id, metric_key, [], str(e) or type(e).__name__)
+            submit_next()
+    return results
+
+def search_runs(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = client.post(
+        "/runs/search",
         json={
             "experiment_ids": experiment_ids, 
             "filter": filter,
@@ -184,16 +613,38 @@ def search_runs(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", max_re
             "page_token": page_token
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return res if raw else parse(res)
+
+def iter_run_pages(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", order_by=None, page_size=RUN_SEARCH_PAGE_SIZE):
+    # the next page is requested on fetch_executor as soon as its token is known,
+    # so it downloads while the caller is still consuming the current one
+    def fetch(page_token):
+        return fetch_executor.submit(search_runs, experiment_ids, filter, run_view_type, page_size, order_by, page_token)
+
+    future = fetch(None)
+    try:
+        while future is not None:
+            res = future.result()
+            if not isinstance(res, dict):
+                raise requests.HTTPError(res)
+            page_token = res.get("next_page_token")
+            future = fetch(page_token) if page_token else None
+            yield res.get("runs", [])
+    finally:
+        if future is not None:
+            future.cancel()
+
+def iter_runs(experiment_ids, filter=None, run_view_type="ACTIVE_ONLY", order_by=None, page_size=RUN_SEARCH_PAGE_SIZE):
+    for page in iter_run_pages(experiment_ids, filter, run_view_type, order_by, page_size):
+        yield from page
 
 def update_run(run_id, status=None, end_time=None, run_name=None):
     if status:
         end_time = end_time if end_time else int(datetime.now().timestamp())
     else:
         end_time = None
-    res = requests.post(
-        f"{url}/runs/update",
-        headers=headers,
+    res = client.post(
+        "/runs/update",
         json={
             "run_id": run_id, 
             "status": status,
@@ -201,16 +652,16 @@ def update_run(run_id, status=None, end_time=None, run_name=None):
             "run_name": run_name
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_run(run_id)
+    return parse(res)
 
 # =========================
 # Models (Model Registry)
 # =========================
 
 def create_registered_model(name, tags=None, description=None, deployment_job_id=None):
-    res = requests.post(
-        f"{url}/registered-models/create",
-        headers=headers,
+    res = client.post(
+        "/registered-models/create",
         json={
             "name": name,
             "tags": tags,
@@ -218,51 +669,52 @@ def create_registered_model(name, tags=None, description=None, deployment_job_id
             "deployment_job_id": deployment_job_id
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def get_registered_model(name):
-    res = requests.get(
-        f"{url}/registered-models/get",
-        headers=headers,
-        params={"name": name}
-    )
-    return res.json() if res.status_code == 200 else res.text
+    def load():
+        res = client.get(
+            "/registered-models/get",
+            params={"name": name}
+        )
+        return parse(res)
+    return read_through(("model", name), load)
 
 def rename_registered_model(name, new_name):
-    res = requests.post(
-        f"{url}/registered-models/rename",
-        headers=headers,
+    res = client.post(
+        "/registered-models/rename",
         json={
             "name": name,
             "new_name": new_name
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    evict_model(new_name)
+    return parse(res)
 
 def update_registered_model(name, description=None, deployment_job_id=None):
-    res = requests.patch(
-        f"{url}/registered-models/update",
-        headers=headers,
+    res = client.patch(
+        "/registered-models/update",
         json={
             "name": name,
             "description": description,
             "deployment_job_id": deployment_job_id
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def delete_registered_model(name):
-    res = requests.delete(
-        f"{url}/registered-models/delete",
-        headers=headers,
+    res = client.delete(
+        "/registered-models/delete",
         json={"name": name}
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
-def search_registered_models(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None):
-    res = requests.get(
-        f"{url}/registered-models/search",
-        headers=headers,
+def search_registered_models(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = client.get(
+        "/registered-models/search",
         params={
             "filter": filter,
             "max_results": max_results,
@@ -270,73 +722,71 @@ def search_registered_models(filter=None, max_results=MAX_RESULTS, order_by=None
             "page_token": page_token
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return res if raw else parse(res)
 
 def set_registered_model_tag(name, key, value):
-    res = requests.post(
-        f"{url}/registered-models/set-tag",
-        headers=headers,
+    res = client.post(
+        "/registered-models/set-tag",
         json={
             "name": name,
             "key": key,
             "value": value
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def delete_registered_model_tag(name, key):
-    res = requests.delete(
-        f"{url}/registered-models/delete-tag",
-        headers=headers,
+    res = client.delete(
+        "/registered-models/delete-tag",
         json={
             "name": name,
             "key": key
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def delete_registered_model_alias(name, alias):
-    res = requests.delete(
-        f"{url}/registered-models/alias",
-        headers=headers,
+    res = client.delete(
+        "/registered-models/alias",
         json={
             "name": name,
             "alias": alias
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def set_registered_model_alias(name, alias, version):
-    res = requests.post(
-        f"{url}/registered-models/alias",
-        headers=headers,
+    res = client.post(
+        "/registered-models/alias",
         json={
             "name": name,
             "alias": alias,
             "version": version
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 # =========================
 # Model Versions
 # =========================
 
 def get_latest_model_versions(name, stages=None):
-    res = requests.post(
-        f"{url}/registered-models/get-latest-versions",
-        headers=headers,
+    res = client.post(
+        "/registered-models/get-latest-versions",
         json={
             "name": name,
             "stages": stages
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def create_model_version(name, source, run_id=None, tags=None, run_link=None, description=None, model_id=None):
-    res = requests.post(
-        f"{url}/model-versions/create",
-        headers=headers,
+    res = client.post(
+        "/model-versions/create",
         json={
             "name": name,
             "source": source,
@@ -347,46 +797,49 @@ def create_model_version(name, source, run_id=None, tags=None, run_link=None, de
             "model_id": model_id
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def get_model_version(name, version):
-    res = requests.get(
-        f"{url}/model-versions/get",
-        headers=headers,
-        params={
-            "name": name,
-            "version": version
-        }
-    )
-    return res.json() if res.status_code == 200 else res.text
+    def load():
+        res = client.get(
+            "/model-versions/get",
+            params={
+                "name": name,
+                "version": version
+            }
+        )
+        return parse(res)
+    return read_through(("model_version", name, str(version)), load)
 
 def update_model_version(name, version, description=None):
-    res = requests.patch(
-        f"{url}/model-versions/update",
-        headers=headers,
+    res = client.patch(
+        "/model-versions/update",
         json={
             "name": name,
             "version": version,
             "description": description
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def delete_model_version(name, version):
-    res = requests.delete(
-        f"{url}/model-versions/delete",
-        headers=headers,
+    res = client.delete(
+        "/model-versions/delete",
         json={
             "name": name,
             "version": version
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    model_cache.discard(name, version)
+    model_server.discard(name, version)
+    return parse(res)
 
-def search_model_versions(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None):
-    res = requests.get(
-        f"{url}/model-versions/search",
-        headers=headers,
+def search_model_versions(filter=None, max_results=MAX_RESULTS, order_by=None, page_token=None, raw=False):
+    res = client.get(
+        "/model-versions/search",
         params={
             "filter": filter,
             "max_results": max_results,
@@ -394,23 +847,21 @@ def search_model_versions(filter=None, max_results=MAX_RESULTS, order_by=None, p
             "page_token": page_token
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return res if raw else parse(res)
 
 def get_model_version_download_uri(name, version):
-    res = requests.get(
-        f"{url}/model-versions/get-download-uri",
-        headers=headers,
+    res = client.get(
+        "/model-versions/get-download-uri",
         params={
             "name": name,
             "version": version
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    return parse(res)
 
 def transition_model_version_stage(name, version, stage, archive_existing_versions):
-    res = requests.post(
-        f"{url}/model-versions/transition-stage",
-        headers=headers,
+    res = client.post(
+        "/model-versions/transition-stage",
         json={
             "name": name,
             "version": version,
@@ -418,12 +869,12 @@ def transition_model_version_stage(name, version, stage, archive_existing_versio
             "archive_existing_versions": archive_existing_versions
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def set_model_version_tag(name, version, key, value):
-    res = requests.post(
-        f"{url}/model-versions/set-tag",
-        headers=headers,
+    res = client.post(
+        "/model-versions/set-tag",
         json={
             "name": name,
             "version": version,
@@ -431,43 +882,192 @@ def set_model_version_tag(name, version, key, value):
             "value": value
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def delete_model_version_tag(name, version, key):
-    res = requests.delete(
-        f"{url}/model-versions/delete-tag",
-        headers=headers,
+    res = client.delete(
+        "/model-versions/delete-tag",
         json={
             "name": name,
             "version": version,
             "key": key
         }
     )
-    return res.json() if res.status_code == 200 else res.text
+    evict_model(name)
+    return parse(res)
 
 def get_model_version_by_alias(name, alias):
-    res = requests.get(
-        f"{url}/registered-models/alias",
-        headers=headers,
-        params={
-            "name": name,
-            "alias": alias
-        }
-    )
-    return res.json() if res.status_code == 200 else res.text
+    def load():
+        res = client.get(
+            "/registered-models/alias",
+            params={
+                "name": name,
+                "alias": alias
+            }
+        )
+        return parse(res)
+    return read_through(("alias", name, alias), load)
 
 # =========================
 # Artifacts
 # =========================
 
 def list_artifacts(run_id, path, page_token=None):
-    res = requests.get(
-        f"{url}/artifacts/list", 
-        headers=headers, 
+    res = client.get(
+        "/artifacts/list",
         params={
             "run_id": run_id, 
             "path": path, 
             "page_token": page_token
         }
     )
-    return res.json() if res.status_code == 200 else res.text
\ No newline at end of file
+    return parse(res)
+
+def list_artifact_dir(run_id, path):
+    # one directory, every page
+    files = []
+    page_token = None
+    while True:
+        res = list_artifacts(run_id, path, page_token)
+        if not isinstance(res, dict):
+            raise requests.HTTPError(res)
+        files.extend(res.get("files", []))
+        page_token = res.get("next_page_token")
+        if not page_token:
+            return files
+
+def walk_artifacts(run_id, path="", max_depth=None, pattern=None, max_files=ARTIFACT_TREE_MAX_FILES):
+    # breadth-first over tree_executor; every directory listing is one task and only
+    # this (calling) thread schedules new ones, so tasks never wait on each other
+    pending = {tree_executor.submit(list_artifact_dir, run_id, path): 0}
+    files = []
+    directories = 0
+    truncated = False
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                depth = pending.pop(future)
+                for f in future.result():
+                    if f.get("is_dir"):
+                        directories += 1
+                        if max_depth is None or depth < max_depth:
+                            pending[tree_executor.submit(list_artifact_dir, run_id, f["path"])] = depth + 1
+                    elif pattern is None or fnmatchcase(f["path"], pattern):
+                        files.append({"path": f["path"], "file_size": int(f.get("file_size", 0))})
+
+            if len(files) >= max_files:
+                truncated = bool(pending) or len(files) > max_files
+                files = files[:max_files]
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+
+    files.sort(key=lambda f: f["path"])
+    return {
+        "root": path,
+        "files": files,
+        "file_count": len(files),
+        "directory_count": directories,
+        "total_bytes": sum(f["file_size"] for f in files),
+        "truncated": truncated
+    }
+
+def artifact_location(artifact_uri):
+    # mlflow-artifacts:/1/<run_id>/artifacts -> 1/<run_id>/artifacts
+    uri = urlparse(artifact_uri)
+    if uri.scheme != "mlflow-artifacts":
+        raise ValueError(f"'{artifact_uri}' is not served by the MLflow artifact proxy")
+    return uri.path.strip("/")
+
+def resolve_artifact(run_id, path):
+    # -> (experiment_id, path under the artifact proxy); raises LookupError / ValueError
+    run = get_run(run_id)
+    if not isinstance(run, dict) or "run" not in run:
+        raise LookupError(f"Run '{run_id}' not found")
+
+    info = run["run"]["info"]
+    root = artifact_location(info["artifact_uri"])
+
+    # never let a path climb out of the run's artifact root
+    parts = [p for p in path.split("/") if p not in ("", ".")]
+    if not parts or ".." in parts:
+        raise ValueError("'path' is invalid")
+
+    return info["experiment_id"], "/".join([root] + parts)
+
+def open_artifact(location, request_headers=None):
+    # streamed response; the caller reads it with iter_content and must close it
+    return artifact_client.get(
+        f"/artifacts/{quote(location)}",
+        headers={**(request_headers or {}), "Accept-Encoding": "identity"},
+        stream=True
+    )
+
+def upload_artifact(location, data):
+    # data is file-like with a length (uploads.PartsReader), streamed to MLflow without buffering
+    return upload_client.request(
+        "PUT",
+        f"/artifacts/{quote(location)}",
+        data=data,
+        headers={"Content-Type": "application/octet-stream"}
+    )
+
+def list_artifact_location(location):
+    res = artifact_client.get("/artifacts", params={"path": location})
+    if res.status_code != 200:
+        raise requests.HTTPError(res.text)
+    return fastjson.loads(res.content).get("files", [])
+
+# =========================
+# Model artifact cache
+# =========================
+
+model_cache = ModelCache(os.getenv("MODEL_CACHE_DIR"), MODEL_CACHE_MAX_BYTES, list_artifact_location, open_artifact)
+
+class ModelNotFoundError(LookupError):
+    # the registry has no such alias or version; a LookupError raised by model code is not this
+    pass
+
+def resolve_alias(name, alias):
+    # goes through the entity cache, so a moved alias is picked up within ENTITY_CACHE_TTL
+    res = get_model_version_by_alias(name, alias)
+    if not isinstance(res, dict) or "model_version" not in res:
+        raise ModelNotFoundError(f"Alias '{alias}' of model '{name}' not found")
+    return str(res["model_version"]["version"])
+
+def pin_model_version(name, version=None, alias=None):
+    # context manager -> (manifest, hit); the version's files stay on disk until it exits.
+    # aliases are resolved on every call since they move between versions
+    if version is None:
+        version = resolve_alias(name, alias)
+
+    def resolve_location():
+        res = get_model_version_download_uri(name, version)
+        if not isinstance(res, dict) or "artifact_uri" not in res:
+            raise ModelNotFoundError(f"Version '{version}' of model '{name}' not found")
+        return artifact_location(res["artifact_uri"])
+
+    return model_cache.pinned(name, str(version), resolve_location)
+
+def cache_model_version(name, version=None, alias=None):
+    # -> (manifest, hit)
+    with pin_model_version(name, version=version, alias=alias) as res:
+        return res
+
+# =========================
+# Model serving
+# =========================
+
+# checked without importing it; mlflow is only imported by workers that actually serve predictions
+MLFLOW_INSTALLED = importlib.util.find_spec("mlflow") is not None
+
+def load_model_version(name, version):
+    import mlflow.pyfunc
+    # pinned until the model is loaded, so eviction cannot remove its tree halfway through
+    with pin_model_version(name, version=version) as (manifest, _):
+        return mlflow.pyfunc.load_model(model_cache.materialize(manifest))
+
+model_server = ModelServer(load_model_version, SERVING_MAX_MODELS, PREDICT_MAX_BATCH_SIZE, PREDICT_MAX_WAIT)
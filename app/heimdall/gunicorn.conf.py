@@ -0,0 +1,39 @@
+import os
+
+# Production server settings for `HEIMDALL_MODE=gunicorn python main.py`
+# (or `gunicorn main:app` from this directory).
+
+
+def cpu_count():
+    # honours container CPU pinning where the platform exposes it
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(cpu_count())))
+worker_class = "gthread"
+# heimdall mostly waits on MLflow and Cerberus; threads share the worker's MLflow connection pool (MLFLOW_POOL_SIZE)
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# bulk history, compare and export routes can legitimately run long
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+# functions.py builds its HTTP sessions and executor at import, so each worker imports the app after the fork
+preload_app = False
+
+
+def worker_exit(server, worker):
+    import functions as fn
+    fn.fetch_executor.shutdown(wait=False, cancel_futures=True)
+    fn.bulk_executor.shutdown(wait=False, cancel_futures=True)
+    fn.tree_executor.shutdown(wait=False, cancel_futures=True)
+    fn.client.close()
+    fn.cerberus_client.close()
+    fn.upload_client.close()
+    fn.artifact_client.close()
@@ -1,10 +1,108 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, send_file
 from flask_cors import CORS
+from flask_compress import Compress
 import functions as fn
-import requests, json
+import downsample as ds
+import columnar
+import serving
+import fastjson
+from uploads import UploadError
+import requests, json, os
+from concurrent.futures import TimeoutError as FutureTimeout
 
 app = Flask(__name__)
-CORS(app)
+app.json = fastjson.ORJSONProvider(app)
+CORS(app, expose_headers=["ETag"])
+
+# negotiated brotli/gzip for JSON bodies above COMPRESS_MIN_SIZE bytes; streams stay uncompressed so rows flush immediately
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+app.config["COMPRESS_LEVEL"] = int(os.getenv("COMPRESS_LEVEL", "6"))
+app.config["COMPRESS_BR_LEVEL"] = int(os.getenv("COMPRESS_BR_LEVEL", "4"))
+app.config["COMPRESS_STREAMS"] = False
+Compress(app)
+
+BULK_MAX_SERIES = int(os.getenv("BULK_MAX_SERIES", "2000"))
+COMPARE_MAX_RUNS = int(os.getenv("COMPARE_MAX_RUNS", "50000"))
+ARTIFACT_CHUNK_SIZE = int(os.getenv("ARTIFACT_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(16 * 1024 * 1024)))
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_SIZE", str(256 * 1024 * 1024)))
+PREDICT_TIMEOUT = float(os.getenv("PREDICT_TIMEOUT", "30"))
+PREDICT_MAX_ROWS = int(os.getenv("PREDICT_MAX_ROWS", "10000"))
+
+# forwarded between the client and MLflow's artifact proxy on downloads
+ARTIFACT_REQUEST_HEADERS = ("Range", "If-Range", "If-None-Match", "If-Modified-Since")
+ARTIFACT_RESPONSE_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified", "Content-Disposition")
+
+# read-only routes that take their query as a JSON body; they get ETags like GET routes
+CONDITIONAL_POST_ROUTES = {
+    "/api/experiments/search",
+    "/api/runs/search",
+    "/api/runs/compare",
+    "/api/metrics/get-history-bulk",
+    "/api/models/versions/latest"
+}
+
+# =========================
+# Helpers
+# =========================
+
+def stream_ndjson_pages(pages):
+    # the first page is read up front so upstream errors still get a proper status code
+    try:
+        first_page = next(pages, [])
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+
+    def generate():
+        yield b"".join(fastjson.dumps(item) + b"\n" for item in first_page)
+        try:
+            for page in pages:
+                yield b"".join(fastjson.dumps(item) + b"\n" for item in page)
+        except requests.RequestException as e:
+            yield fastjson.dumps({"error": str(e)}) + b"\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def respond(res):
+    # raw MLflow responses (pass-through mode) are forwarded byte-for-byte with MLflow's status
+    if isinstance(res, requests.Response):
+        return Response(res.content, status=res.status_code, mimetype="application/json")
+    return jsonify(res)
+
+def can_view_experiment(experiment_id):
+    # a run and its artifacts are readable by whoever can view the run's experiment
+    user_id = request.headers.get("X-User-Id")
+    return int(experiment_id) in {int(elem_id) for elem_id, _ in fn.get_viewable_elements(user_id, "experiment")}
+
+def etag_matches(etag, tags):
+    # flask-compress appends ":<encoding>" to the ETag of compressed responses
+    return tags.star_tag or any(tag.split(":")[0] == etag for tag in tags.as_set(include_weak=True))
+
+def is_conditional(response):
+    if response.status_code != 200 or response.is_streamed:
+        return False
+    return request.method in ("GET", "HEAD") or (request.method == "POST" and request.path in CONDITIONAL_POST_ROUTES)
+
+@app.after_request
+def add_etag(response):
+    # strong ETag over the response body; clients revalidate with If-None-Match and get a bodiless 304
+    if not is_conditional(response):
+        return response
+
+    response.add_etag()
+    response.headers["Cache-Control"] = "no-cache"
+    # permission-filtered results differ per user
+    response.vary.add("X-User-Id")
+
+    etag, _ = response.get_etag()
+    if etag_matches(etag, request.if_none_match):
+        not_modified = Response(status=304)
+        not_modified.set_etag(etag)
+        not_modified.headers["Cache-Control"] = "no-cache"
+        not_modified.vary.add("X-User-Id")
+        return not_modified
+    return response
 
 # =========================
 # Basic
@@ -40,16 +138,33 @@ def api_create_experiment():
 @app.route("/api/experiments/search", methods=["POST"])
 def api_search_experiments():
     user_id = request.headers.get("X-User-Id")
-    res = requests.get(
-            "http://ml-studio-web-1:5000/api/get_viewable_elements?comp_name=experiment", 
-            headers={"X-User-Id": user_id}, 
-            timeout=5
-        )
-    res.raise_for_status()
-    elem_ids = res.json()["elem_ids"]
+    elem_ids = fn.get_viewable_elements(user_id, "experiment")
     dict_elem_ids = {k: v for k, v in sorted(elem_ids)}
 
+    def is_permitted(e):
+        return (int(e["experiment_id"]) in dict_elem_ids.keys()) and (e["lifecycle_stage"] != "delete" or dict_elem_ids[int(e["experiment_id"])] == user_id)
+
     data = request.json or {}
+
+    # fill_pages: keep reading MLflow pages until max_results permitted experiments are found
+    if data.get("fill_pages"):
+        try:
+            max_results = fn.parse_max_results(data.get("max_results"))
+        except ValueError:
+            return jsonify({"error": "'max_results' must be a positive integer"}), 400
+        try:
+            res = fn.search_permitted_experiments(
+                is_permitted,
+                max_results=max_results,
+                page_token=data.get("page_token"),
+                filter=data.get("filter"),
+                order_by=data.get("order_by"),
+                view_type=data.get("view_type", "ACTIVE_ONLY")
+            )
+        except ValueError:
+            return jsonify({"error": "'page_token' is invalid"}), 400
+        return jsonify(res)
+
     res = fn.search_experiments(
         max_results=data.get("max_results", 500),
         page_token=data.get("page_token"),
@@ -58,7 +173,7 @@ def api_search_experiments():
         view_type=data.get("view_type", "ACTIVE_ONLY")
     )
     exp = res["experiments"]
-    res_final = [e for e in exp if (int(e["experiment_id"]) in dict_elem_ids.keys()) and (e["lifecycle_stage"] != "delete" or dict_elem_ids[e["experiment_id"]] == user_id)]
+    res_final = [e for e in exp if is_permitted(e)]
     return jsonify(res_final)
 
 @app.route("/api/experiments/get", methods=["GET"])
@@ -184,9 +299,63 @@ def api_get_metric_history():
     max_results = request.args.get("max_results", 500)
     if not run_id or not metric_key:
         return jsonify({"error": "'run_id' and 'metric_key' are required"}), 400
-    res = fn.get_metric_history(run_id, metric_key, max_results)
+    res = fn.get_metric_history(run_id, metric_key, max_results, raw=fn.PASSTHROUGH)
+    return respond(res)
+
+@app.route("/api/metrics/get-history-stream", methods=["GET"])
+def api_stream_metric_history():
+    run_id = request.args.get("run_id")
+    metric_key = request.args.get("metric_key")
+    if not run_id or not metric_key:
+        return jsonify({"error": "'run_id' and 'metric_key' are required"}), 400
+
+    return stream_ndjson_pages(fn.iter_metric_history(run_id, metric_key))
+
+@app.route("/api/metrics/get-history-downsampled", methods=["GET"])
+def api_get_downsampled_metric_history():
+    run_id = request.args.get("run_id")
+    metric_key = request.args.get("metric_key")
+    mode = request.args.get("mode", "lttb")
+    if not run_id or not metric_key:
+        return jsonify({"error": "'run_id' and 'metric_key' are required"}), 400
+    if mode not in ds.MODES:
+        return jsonify({"error": f"'mode' must be one of {list(ds.MODES)}"}), 400
+    # parsed by hand: type=int would quietly fall back to the default for non-numeric input
+    try:
+        points = int(request.args.get("points", 1500))
+    except ValueError:
+        points = 0
+    if points < 1:
+        return jsonify({"error": "'points' must be a positive integer"}), 400
+
+    try:
+        metrics = [m for page in fn.iter_metric_history(run_id, metric_key) for m in page]
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+
+    res = ds.downsample(metrics, points, mode)
+    res.update({"run_id": run_id, "metric_key": metric_key})
     return jsonify(res)
 
+@app.route("/api/metrics/get-history-bulk", methods=["POST"])
+def api_get_metric_histories():
+    data = request.json or {}
+    run_ids = data.get("run_ids")
+    metric_keys = data.get("metric_keys")
+    output = data.get("format", "json")
+    if not isinstance(run_ids, list) or not isinstance(metric_keys, list) or not run_ids or not metric_keys:
+        return jsonify({"error": "'run_ids' and 'metric_keys' must be non-empty lists"}), 400
+    if len(run_ids) * len(metric_keys) > BULK_MAX_SERIES:
+        return jsonify({"error": f"At most {BULK_MAX_SERIES} run/metric pairs are allowed per request"}), 400
+    if output not in ("json", "binary"):
+        return jsonify({"error": "'format' must be 'json' or 'binary'"}), 400
+
+    results = fn.get_metric_histories([(run_id, key) for run_id in run_ids for key in metric_keys])
+
+    if output == "binary":
+        return Response(columnar.metric_series_binary(results), mimetype=columnar.BINARY_MIMETYPE)
+    return jsonify(columnar.metric_series_json(results))
+
 @app.route("/api/runs/search", methods=["POST"])
 def api_search_runs():
     data = request.json or {}
@@ -199,9 +368,54 @@ def api_search_runs():
         run_view_type=data.get("run_view_type", "ACTIVE_ONLY"),
         max_results=data.get("max_results", 500),
         order_by=data.get("order_by"),
-        page_token=data.get("page_token")
+        page_token=data.get("page_token"),
+        raw=fn.PASSTHROUGH
     )
-    return jsonify(res)
+    return respond(res)
+
+@app.route("/api/runs/search-stream", methods=["POST"])
+def api_stream_runs():
+    data = request.json or {}
+    experiment_ids = data.get("experiment_ids")
+    if not experiment_ids:
+        return jsonify({"error": "'experiment_ids' is required"}), 400
+    pages = fn.iter_run_pages(
+        experiment_ids=experiment_ids,
+        filter=data.get("filter"),
+        run_view_type=data.get("run_view_type", "ACTIVE_ONLY"),
+        order_by=data.get("order_by")
+    )
+    return stream_ndjson_pages(pages)
+
+@app.route("/api/runs/compare", methods=["POST"])
+def api_compare_runs():
+    data = request.json or {}
+    experiment_ids = data.get("experiment_ids")
+    columns = data.get("columns")
+    output = data.get("format", "json")
+    if not experiment_ids:
+        return jsonify({"error": "'experiment_ids' is required"}), 400
+    if columns is not None and (not isinstance(columns, list) or not all(isinstance(c, str) for c in columns)):
+        return jsonify({"error": "'columns' must be a list of column names"}), 400
+    if output not in ("json", "arrow"):
+        return jsonify({"error": "'format' must be 'json' or 'arrow'"}), 400
+
+    pages = fn.iter_run_pages(
+        experiment_ids=experiment_ids,
+        filter=data.get("filter"),
+        run_view_type=data.get("run_view_type", "ACTIVE_ONLY"),
+        order_by=data.get("order_by")
+    )
+    try:
+        index, frame = columnar.pivot_runs(pages, columns, COMPARE_MAX_RUNS)
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if output == "arrow":
+        return Response(columnar.runs_frame_arrow(index, frame), mimetype=columnar.ARROW_STREAM_MIMETYPE)
+    return jsonify(columnar.runs_frame_json(index, frame))
 
 @app.route("/api/runs/update", methods=["POST"])
 def api_update_run():
@@ -286,9 +500,10 @@ def api_search_registered_models():
         filter=request.args.get("filter"),
         max_results=request.args.get("max_results", 500),
         order_by=request.args.get("order_by"),
-        page_token=request.args.get("page_token")
+        page_token=request.args.get("page_token"),
+        raw=fn.PASSTHROUGH
     )
-    return jsonify(res)
+    return respond(res)
 
 @app.route("/api/models/set-tag", methods=["POST"])
 def api_set_registered_model_tag():
@@ -403,9 +618,10 @@ def api_search_model_versions():
         filter=request.args.get("filter"),
         max_results=request.args.get("max_results", 500),
         order_by=request.args.get("order_by"),
-        page_token=request.args.get("page_token")
+        page_token=request.args.get("page_token"),
+        raw=fn.PASSTHROUGH
     )
-    return jsonify(res)
+    return respond(res)
 
 @app.route("/api/models/versions/download-uri", methods=["GET"])
 def api_get_model_version_download_uri():
@@ -465,6 +681,123 @@ def api_get_model_version_by_alias():
     res = fn.get_model_version_by_alias(name, alias)
     return jsonify(res)
 
+def check_model_permission(name):
+    # -> an error response, or None when the caller may view the registered model
+    try:
+        permitted = fn.has_model_permission(request.headers.get("X-User-Id"), name, "view")
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    if not permitted:
+        return jsonify({"error": "Permission denied"}), 403
+    return None
+
+def model_version_query():
+    # shared by the two cache routes; returns ((name, version, alias), None) or (None, error response)
+    name = request.args.get("name")
+    version = request.args.get("version")
+    alias = request.args.get("alias")
+    if not name or not (version or alias):
+        return None, (jsonify({"error": "'name' and 'version' or 'alias' are required"}), 400)
+    error = check_model_permission(name)
+    if error:
+        return None, error
+    return (name, version, alias), None
+
+def model_cache_error(e):
+    if isinstance(e, LookupError):
+        return jsonify({"error": str(e)}), 404
+    if isinstance(e, ValueError):
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"error": str(e)}), 502
+
+@app.route("/api/models/versions/cached", methods=["GET"])
+def api_cached_model_version():
+    query, error = model_version_query()
+    if error:
+        return error
+    name, version, alias = query
+    try:
+        manifest, hit = fn.cache_model_version(name, version=version, alias=alias)
+    except (LookupError, ValueError, requests.RequestException) as e:
+        return model_cache_error(e)
+    return jsonify({**manifest, "cache_hit": hit})
+
+@app.route("/api/models/versions/cached/file", methods=["GET"])
+def api_cached_model_file():
+    path = request.args.get("path")
+    if not path:
+        return jsonify({"error": "'path' is required"}), 400
+    query, error = model_version_query()
+    if error:
+        return error
+    name, version, alias = query
+
+    try:
+        # pinned until send_file has opened the blob; the open file outlives a later eviction
+        with fn.pin_model_version(name, version=version, alias=alias) as (manifest, _):
+            entry = next((f for f in manifest["files"] if f["path"] == path), None)
+            if entry is None:
+                return jsonify({"error": f"'{path}' is not part of model version {manifest['version']}"}), 404
+            # the content hash is a natural strong ETag; send_file also answers Range requests
+            return send_file(
+                fn.model_cache.blob_path(entry["sha256"]),
+                mimetype="application/octet-stream",
+                as_attachment=True,
+                download_name=os.path.basename(path),
+                etag=entry["sha256"],
+                conditional=True
+            )
+    except (LookupError, ValueError, requests.RequestException) as e:
+        return model_cache_error(e)
+
+@app.route("/api/models/<name>/<alias>/predict", methods=["POST"])
+def api_predict(name, alias):
+    error = check_model_permission(name)
+    if error:
+        return error
+    if not fn.MLFLOW_INSTALLED:
+        return jsonify({"error": "Model serving requires mlflow to be installed"}), 501
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "A JSON object body is required"}), 400
+    try:
+        frame = serving.to_frame(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if len(frame) > PREDICT_MAX_ROWS:
+        return jsonify({"error": f"At most {PREDICT_MAX_ROWS} rows per request"}), 400
+
+    try:
+        # the alias is resolved per request, so a moved alias serves its new version once the entity cache expires
+        version = fn.resolve_alias(name, alias)
+        model = fn.model_server.get(name, version)
+    except fn.ModelNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    except Exception as e:
+        # includes a missing dependency of the model's flavor and lookup errors from the model's own code
+        return jsonify({"error": f"Could not load model '{name}': {e}"}), 500
+
+    try:
+        predictions = model.submit(frame).result(PREDICT_TIMEOUT)
+    except FutureTimeout:
+        return jsonify({"error": f"Prediction did not finish within {PREDICT_TIMEOUT:g}s"}), 504
+    except Exception as e:
+        # MLflow rejects input that does not match the model signature as INVALID_PARAMETER_VALUE;
+        # anything else failed inside the model
+        if getattr(e, "error_code", None) == "INVALID_PARAMETER_VALUE":
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"error": f"Prediction failed: {e}"}), 500
+
+    return jsonify({
+        "model": name,
+        "alias": alias,
+        "version": version,
+        "predictions": serving.to_json(predictions)
+    })
+
 # =========================
 # Artifacts API
 # =========================
@@ -478,9 +811,244 @@ def api_list_artifacts():
     res = fn.list_artifacts(run_id, path, request.args.get("page_token"))
     return jsonify(res)
 
+@app.route("/api/artifacts/tree", methods=["GET"])
+def api_artifact_tree():
+    run_id = request.args.get("run_id")
+    if not run_id:
+        return jsonify({"error": "'run_id' is required"}), 400
+    # parsed by hand: type=int would turn a bad value into None, which means no depth limit
+    max_depth = request.args.get("max_depth")
+    if max_depth is not None:
+        try:
+            max_depth = int(max_depth)
+        except ValueError:
+            max_depth = -1
+        if max_depth < 0:
+            return jsonify({"error": "'max_depth' must be a non-negative integer"}), 400
+
+    try:
+        run = fn.get_run(run_id)
+        if not isinstance(run, dict) or "run" not in run:
+            return jsonify({"error": f"Run '{run_id}' not found"}), 404
+        allowed = can_view_experiment(run["run"]["info"]["experiment_id"])
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    if not allowed:
+        return jsonify({"error": "Permission denied"}), 403
+
+    try:
+        res = fn.walk_artifacts(
+            run_id,
+            path=request.args.get("path", ""),
+            max_depth=max_depth,
+            pattern=request.args.get("glob")
+        )
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    return jsonify(res)
+
+@app.route("/api/artifacts/download", methods=["GET"])
+def api_download_artifact():
+    run_id = request.args.get("run_id")
+    path = request.args.get("path")
+    if not run_id or not path:
+        return jsonify({"error": "'run_id' and 'path' are required"}), 400
+
+    try:
+        experiment_id, location = fn.resolve_artifact(run_id, path)
+        allowed = can_view_experiment(experiment_id)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+
+    if not allowed:
+        return jsonify({"error": "Permission denied"}), 403
+
+    try:
+        upstream = fn.open_artifact(location, {h: request.headers[h] for h in ARTIFACT_REQUEST_HEADERS if h in request.headers})
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+
+    def generate():
+        # fixed-size chunks straight from the upstream socket; memory stays at one chunk per download
+        try:
+            yield from upstream.iter_content(chunk_size=ARTIFACT_CHUNK_SIZE)
+        finally:
+            upstream.close()
+
+    return Response(
+        generate(),
+        status=upstream.status_code,
+        headers={h: upstream.headers[h] for h in ARTIFACT_RESPONSE_HEADERS if h in upstream.headers},
+        direct_passthrough=True
+    )
+
+# multipart uploads: start -> chunk (any order, in parallel, retryable) -> complete
+@app.route("/api/artifacts/upload/start", methods=["POST"])
+def api_start_upload():
+    data = request.json or {}
+    run_id = data.get("run_id")
+    path = data.get("path")
+    size = data.get("size")
+    chunk_size = data.get("chunk_size", UPLOAD_CHUNK_SIZE)
+    if not run_id or not path or not isinstance(size, int) or size < 0:
+        return jsonify({"error": "'run_id', 'path' and 'size' are required"}), 400
+    if not isinstance(chunk_size, int) or not 0 < chunk_size <= UPLOAD_MAX_CHUNK_SIZE:
+        return jsonify({"error": f"'chunk_size' must be between 1 and {UPLOAD_MAX_CHUNK_SIZE}"}), 400
+
+    try:
+        experiment_id, location = fn.resolve_artifact(run_id, path)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    user_id = request.headers.get("X-User-Id")
+    try:
+        permitted = fn.has_permission(user_id, experiment_id, "edit")
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    if not permitted:
+        return jsonify({"error": "Permission denied"}), 403
+
+    manifest = fn.upload_store.create(user_id, run_id, path, location, size, chunk_size)
+    return jsonify(fn.upload_store.status(manifest)), 201
+
+@app.route("/api/artifacts/upload/chunk", methods=["PUT"])
+def api_upload_chunk():
+    upload_id = request.args.get("upload_id")
+    index = request.args.get("index", type=int)
+    sha256 = request.headers.get("X-Chunk-SHA256")
+    if not upload_id or index is None or not sha256:
+        return jsonify({"error": "'upload_id', 'index' and the X-Chunk-SHA256 header are required"}), 400
+
+    try:
+        manifest = fn.upload_store.get(upload_id, request.headers.get("X-User-Id"))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+
+    try:
+        res = fn.upload_store.put_chunk(manifest, index, request.stream, sha256)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(res)
+
+@app.route("/api/artifacts/upload/status", methods=["GET"])
+def api_upload_status():
+    upload_id = request.args.get("upload_id")
+    if not upload_id:
+        return jsonify({"error": "'upload_id' is required"}), 400
+    try:
+        manifest = fn.upload_store.get(upload_id, request.headers.get("X-User-Id"))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(fn.upload_store.status(manifest))
+
+@app.route("/api/artifacts/upload/complete", methods=["POST"])
+def api_complete_upload():
+    upload_id = (request.json or {}).get("upload_id")
+    if not upload_id:
+        return jsonify({"error": "'upload_id' is required"}), 400
+    try:
+        manifest = fn.upload_store.get(upload_id, request.headers.get("X-User-Id"))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+
+    try:
+        reader = fn.upload_store.reader(manifest)
+    except UploadError as e:
+        return jsonify({"error": str(e), **fn.upload_store.status(manifest)}), 409
+
+    # chunks stay on disk until MLflow has accepted the file, so a failed complete can be retried
+    try:
+        res = fn.upload_artifact(manifest["location"], reader)
+    except requests.RequestException as e:
+        return jsonify({"error": str(e)}), 502
+    finally:
+        reader.close()
+    if res.status_code != 200:
+        return jsonify({"error": res.text}), 502
+
+    fn.upload_store.delete(upload_id)
+    return jsonify({"run_id": manifest["run_id"], "path": manifest["path"], "size": manifest["size"]})
+
+@app.route("/api/artifacts/upload/abort", methods=["POST"])
+def api_abort_upload():
+    upload_id = (request.json or {}).get("upload_id")
+    if not upload_id:
+        return jsonify({"error": "'upload_id' is required"}), 400
+    try:
+        fn.upload_store.get(upload_id, request.headers.get("X-User-Id"))
+    except KeyError:
+        return jsonify({"error": "Upload not found"}), 404
+    fn.upload_store.delete(upload_id)
+    return jsonify({"upload_id": upload_id, "aborted": True})
+
+# =========================
+# Access Control API
+# =========================
+
+@app.route("/api/elements/add", methods=["POST"])
+def api_add_element():
+    user_id = request.headers.get("X-User-Id")
+    data = request.json or {}
+    component_name = data.get("component_name")
+    elem_name = data.get("elem_name")
+    if not component_name or not elem_name:
+        return jsonify({"error": "'component_name' and 'elem_name' are required"}), 400
+    res = fn.add_element(user_id, data.get("elem_id"), component_name, elem_name)
+    return jsonify(res)
+
+@app.route("/api/elements/delete", methods=["POST"])
+def api_delete_element():
+    user_id = request.headers.get("X-User-Id")
+    data = request.json or {}
+    elem_id = data.get("elem_id")
+    if not elem_id:
+        return jsonify({"error": "'elem_id' is required"}), 400
+    res = fn.delete_element(user_id, elem_id)
+    return jsonify(res)
+
+@app.route("/api/permissions/edit", methods=["POST"])
+def api_edit_user_permission():
+    user_id = request.headers.get("X-User-Id")
+    data = request.json or {}
+    user_id_grant = data.get("user_id")
+    elem_id = data.get("elem_id")
+    if not user_id_grant or not elem_id:
+        return jsonify({"error": "'user_id' and 'elem_id' are required"}), 400
+    res = fn.edit_user_permission(user_id, user_id_grant, elem_id, data.get("operation_name"))
+    return jsonify(res)
+
+@app.route("/api/cache/stats", methods=["GET"])
+def api_cache_stats():
+    return jsonify({
+        "viewable_elements": fn.viewable_cache.stats(),
+        "entities": fn.entity_cache.stats(),
+        "models": fn.model_cache.stats(),
+        "loaded_models": fn.model_server.stats()
+    })
+
 # =========================
 # Main
 # =========================
 
+def run_gunicorn():
+    # production server, configured by gunicorn.conf.py next to this file
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    os.execvp("gunicorn", ["gunicorn", "--chdir", app_dir, "--config", os.path.join(app_dir, "gunicorn.conf.py"), "main:app"])
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    # HEIMDALL_MODE=async serves the same API from the asyncio gateway in async_main.py,
+    # HEIMDALL_MODE=gunicorn from pre-forked gunicorn workers
+    mode = os.getenv("HEIMDALL_MODE", "sync")
+    if mode == "async":
+        import async_main
+        async_main.run(host="0.0.0.0", port=5000)
+    elif mode == "gunicorn":
+        run_gunicorn()
+    else:
+        app.run(host="0.0.0.0", port=5000)
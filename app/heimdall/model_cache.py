@@ -0,0 +1,303 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import posixpath
+import hashlib
+import shutil
+import tempfile
+import threading
+from urllib.parse import quote
+from contextlib import contextmanager
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def segment(value):
+    # one path component per name or version; "." and ".." are escaped so they cannot leave the directory
+    res = quote(str(value), safe="")
+    return res.replace(".", "%2E") if res in (".", "..") else res
+
+
+class ModelCache:
+    # On-disk cache of registered model version artifacts.
+    #
+    #   <root>/blobs/<sha256[:2]>/<sha256>   file contents, shared by every version that contains them
+    #   <root>/versions/<name>/<version>.json  manifest: relative path -> sha256 and size; its mtime is the LRU clock
+    #   <root>/trees/<name>/<version>/        hard-linked directory layout of a version, for model loaders
+    #   <root>/locks/                         flock files; they serialize work across threads and gunicorn workers
+    #
+    # Blobs and manifests are written under tmp/ and renamed into place, so readers only ever
+    # see complete files. A manifest whose blobs have disappeared counts as a miss and is fetched again.
+    def __init__(self, root, max_bytes, list_dir, open_file):
+        self.root = root or os.path.join(tempfile.gettempdir(), "heimdall-model-cache")
+        self.max_bytes = max_bytes
+        self.list_dir = list_dir      # location -> [{"path", "is_dir", "file_size"}], paths relative to location
+        self.open_file = open_file    # location -> streamed requests.Response
+        for sub in ("blobs", "versions", "trees", "locks", "tmp"):
+            os.makedirs(os.path.join(self.root, sub), exist_ok=True)
+        self.stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # =========================
+    # Paths and locking
+    # =========================
+
+    def version_path(self, name, version):
+        return os.path.join(self.root, "versions", segment(name), f"{segment(version)}.json")
+
+    def tree_path(self, name, version):
+        return os.path.join(self.root, "trees", segment(name), segment(version))
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, "blobs", sha256[:2], sha256)
+
+    def gc_pending_path(self):
+        # exists while an eviction pass that had to be skipped is still owed
+        return os.path.join(self.root, "locks", "gc-pending")
+
+    def tmp_path(self):
+        return os.path.join(self.root, "tmp", uuid.uuid4().hex)
+
+    @contextmanager
+    def locked(self, key, mode=fcntl.LOCK_EX):
+        # yields whether the lock was taken, which is only ever False with LOCK_NB in mode
+        name = hashlib.sha1(key.encode()).hexdigest()
+        with open(os.path.join(self.root, "locks", name), "w") as f:
+            try:
+                fcntl.flock(f, mode)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # =========================
+    # Lookup and fetch
+    # =========================
+
+    def lookup(self, name, version):
+        path = self.version_path(name, version)
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.exists(self.blob_path(entry["sha256"])) for entry in manifest["files"]):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return manifest
+
+    @contextmanager
+    def pinned(self, name, version, resolve_location):
+        # -> (manifest, hit); resolve_location() is only called on a miss. The gc lock is held shared
+        # until the block exits, so eviction cannot delete the version's blobs or tree while the
+        # caller is still serving or loading them, nor a fetch's blobs before its manifest is written.
+        with self.locked("gc", fcntl.LOCK_SH):
+            manifest = self.lookup(name, version)
+            hit = manifest is not None
+            if not hit:
+                # one download per version however many threads or workers ask for it at once
+                with self.locked(f"version:{name}:{version}"):
+                    manifest = self.lookup(name, version)
+                    if manifest is None:
+                        manifest = self.fetch(name, version, resolve_location())
+                    else:
+                        hit = True
+            self.count("hits" if hit else "misses")
+            yield manifest, hit
+        if not hit or os.path.exists(self.gc_pending_path()):
+            self.enforce_limit(keep=self.version_path(name, version))
+
+    def ensure(self, name, version, resolve_location):
+        # -> (manifest, hit) for callers that only need the manifest
+        with self.pinned(name, version, resolve_location) as res:
+            return res
+
+    def walk(self, location, prefix=""):
+        for f in self.list_dir(location):
+            name = posixpath.basename(f["path"])
+            rel = f"{prefix}{name}"
+            if f.get("is_dir"):
+                yield from self.walk(f"{location}/{name}", f"{rel}/")
+            else:
+                yield rel
+
+    def fetch(self, name, version, location):
+        files = []
+        for rel in self.walk(location):
+            sha256, size = self.download_blob(f"{location}/{rel}")
+            files.append({"path": rel, "sha256": sha256, "size": size})
+
+        manifest = {
+            "name": name,
+            "version": str(version),
+            "location": location,
+            "files": sorted(files, key=lambda f: f["path"]),
+            "total_bytes": sum(f["size"] for f in files),
+            "cached_at": time.time()
+        }
+        path = self.version_path(name, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = self.tmp_path()
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+        return manifest
+
+    def download_blob(self, location):
+        tmp = self.tmp_path()
+        digest = hashlib.sha256()
+        size = 0
+        res = self.open_file(location)
+        try:
+            res.raise_for_status()
+            with open(tmp, "wb") as f:
+                for block in res.iter_content(chunk_size=BLOCK_SIZE):
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+
+            sha256 = digest.hexdigest()
+            blob = self.blob_path(sha256)
+            if os.path.exists(blob):
+                # identical content is already cached under another version
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp, blob)
+            return sha256, size
+        finally:
+            res.close()
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def materialize(self, manifest):
+        # the version's files as a real directory (hard links into blobs/), built once and renamed into place
+        path = self.tree_path(manifest["name"], manifest["version"])
+        if os.path.isdir(path):
+            return path
+
+        tmp = self.tmp_path()
+        for entry in manifest["files"]:
+            dst = os.path.join(tmp, *entry["path"].split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            try:
+                os.link(self.blob_path(entry["sha256"]), dst)
+            except OSError:
+                shutil.copyfile(self.blob_path(entry["sha256"]), dst)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            # another thread or worker got there first
+            shutil.rmtree(tmp, ignore_errors=True)
+        return path
+
+    # =========================
+    # Eviction
+    # =========================
+
+    def manifests(self):
+        # -> [(mtime, path, manifest)], least recently used first
+        res = []
+        versions = os.path.join(self.root, "versions")
+        for model in os.listdir(versions):
+            for name in os.listdir(os.path.join(versions, model)):
+                path = os.path.join(versions, model, name)
+                try:
+                    with open(path) as f:
+                        res.append((os.path.getmtime(path), path, json.load(f)))
+                except (OSError, ValueError):
+                    pass
+        return sorted(res, key=lambda m: m[0])
+
+    def blob_sizes(self):
+        res = {}
+        blobs = os.path.join(self.root, "blobs")
+        for shard in os.listdir(blobs):
+            for sha256 in os.listdir(os.path.join(blobs, shard)):
+                try:
+                    res[sha256] = os.path.getsize(os.path.join(blobs, shard, sha256))
+                except OSError:
+                    pass
+        return res
+
+    def enforce_limit(self, keep=None):
+        with self.locked("gc", fcntl.LOCK_EX | fcntl.LOCK_NB) as acquired:
+            if not acquired:
+                # a fetch is still running or a version is in use in another thread or worker;
+                # whichever of them finishes next runs this pass
+                open(self.gc_pending_path(), "w").close()
+                return
+            try:
+                os.remove(self.gc_pending_path())
+            except FileNotFoundError:
+                pass
+            manifests = self.manifests()
+            blobs = self.blob_sizes()
+            referenced = {}
+            for _, path, manifest in manifests:
+                for entry in manifest["files"]:
+                    referenced[entry["sha256"]] = referenced.get(entry["sha256"], 0) + 1
+
+            total = sum(blobs.values())
+            if total <= self.max_bytes:
+                return
+
+            # blobs no manifest points at go first (discarded versions, interrupted fetches)
+            for sha256 in [s for s in blobs if not referenced.get(s)]:
+                os.remove(self.blob_path(sha256))
+                total -= blobs.pop(sha256)
+
+            for _, path, manifest in manifests:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                os.remove(path)
+                shutil.rmtree(self.tree_path(manifest["name"], manifest["version"]), ignore_errors=True)
+                self.count("evictions")
+                for entry in manifest["files"]:
+                    sha256 = entry["sha256"]
+                    referenced[sha256] -= 1
+                    if referenced[sha256] == 0 and sha256 in blobs:
+                        os.remove(self.blob_path(sha256))
+                        total -= blobs.pop(sha256)
+
+    def discard(self, name, version):
+        # blobs are left for the next enforce_limit pass; other versions may share them
+        try:
+            os.remove(self.version_path(name, version))
+        except OSError:
+            pass
+        shutil.rmtree(self.tree_path(name, version), ignore_errors=True)
+
+    def count(self, counter):
+        with self.stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        manifests = self.manifests()
+        blobs = self.blob_sizes()
+        logical = sum(m["total_bytes"] for _, _, m in manifests)
+        with self.stats_lock:
+            return {
+                "versions": len(manifests),
+                "blobs": len(blobs),
+                "bytes": sum(blobs.values()),
+                "logical_bytes": logical,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,250 @@
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Request / response payloads
+# =========================
+
+def to_frame(data):
+    # the input formats of MLflow's scoring server
+    if "dataframe_records" in data:
+        return pd.DataFrame.from_records(data["dataframe_records"])
+    if "dataframe_split" in data:
+        split = data["dataframe_split"]
+        return pd.DataFrame(data=split.get("data"), columns=split.get("columns"), index=split.get("index"))
+    if "instances" in data or "inputs" in data:
+        return pd.DataFrame(data.get("instances", data.get("inputs")))
+    raise ValueError("One of 'dataframe_records', 'dataframe_split', 'instances' or 'inputs' is required")
+
+
+def to_json(predictions):
+    if isinstance(predictions, pd.DataFrame):
+        return predictions.to_dict(orient="records")
+    if isinstance(predictions, (pd.Series, np.ndarray)):
+        return predictions.tolist()
+    return predictions
+
+
+def split(predictions, sizes):
+    # one batched prediction -> per-request slices; None when rows cannot be matched back to requests
+    n = sum(sizes)
+    if isinstance(predictions, (pd.DataFrame, pd.Series)):
+        take = lambda start, stop: predictions.iloc[start:stop]
+    elif isinstance(predictions, (np.ndarray, list)):
+        take = lambda start, stop: predictions[start:stop]
+    else:
+        return None
+    if len(predictions) != n:
+        return None
+
+    parts = []
+    start = 0
+    for size in sizes:
+        parts.append(take(start, start + size))
+        start += size
+    return parts
+
+
+# =========================
+# Micro-batching
+# =========================
+
+def schema_key(frame):
+    return tuple((str(column), str(dtype)) for column, dtype in frame.dtypes.items())
+
+
+class MicroBatcher:
+    # Requests queue up here and a single thread scores them together: a batch closes when it
+    # reaches max_batch_size rows or max_wait seconds after its first request arrived.
+    def __init__(self, predict, max_batch_size, max_wait):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.batches = 0
+        self.requests = 0
+        self.rows = 0
+        self.thread = threading.Thread(target=self.run, name="model-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        future = Future()
+        with self.lock:
+            if not self.stopped:
+                self.queue.put((frame, future))
+                return future
+        # evicted while this request was on its way; score it directly
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(self.predict(frame))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def stop(self):
+        # requests already queued are still scored before the thread exits
+        with self.lock:
+            self.stopped = True
+            self.queue.put(None)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            rows = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while rows < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            self.run_batch(batch)
+            if stopping:
+                return
+
+    def run_batch(self, batch):
+        batch = [(frame, future) for frame, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        self.rows += sum(len(frame) for frame, _ in batch)
+
+        # only requests with the same columns and dtypes are scored together; concatenating
+        # anything else would outer-join the columns or upcast them
+        groups = {}
+        for frame, future in batch:
+            groups.setdefault(schema_key(frame), []).append((frame, future))
+        for group in groups.values():
+            self.run_group(group)
+
+    def run_group(self, group):
+        parts = None
+        if len(group) > 1:
+            try:
+                predictions = self.predict(pd.concat([frame for frame, _ in group], ignore_index=True))
+                parts = split(predictions, [len(frame) for frame, _ in group])
+            except Exception:
+                parts = None
+
+        if parts is not None:
+            for (_, future), part in zip(group, parts):
+                future.set_result(part)
+            return
+
+        # a single request, an output that cannot be split, or a batch that failed:
+        # score each request on its own so one bad payload only fails its own caller
+        for frame, future in group:
+            try:
+                future.set_result(self.predict(frame))
+            except Exception as e:
+                future.set_exception(e)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "avg_batch_rows": self.rows / self.batches if self.batches else 0.0
+        }
+
+
+# =========================
+# Loaded models
+# =========================
+
+class ModelServer:
+    # bounded LRU of loaded models, each behind its own MicroBatcher
+    def __init__(self, load, max_models=4, max_batch_size=256, max_wait=0.005):
+        self.load = load  # (name, version) -> object with predict(DataFrame)
+        self.max_models = max_models
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.models = OrderedDict()  # (name, version) -> MicroBatcher
+        self.loading = {}            # (name, version) -> Future of the load in progress
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name, version):
+        key = (name, str(version))
+        with self.lock:
+            batcher = self.models.get(key)
+            if batcher is not None:
+                self.models.move_to_end(key)
+                return batcher
+            loading = self.loading.get(key)
+            owner = loading is None
+            if owner:
+                loading = self.loading[key] = Future()
+
+        # concurrent first requests for one version load it once; the others wait on the
+        # loader's future and get its model or its exception
+        if not owner:
+            return loading.result()
+
+        try:
+            model = self.load(name, version)
+            batcher = MicroBatcher(model.predict, self.max_batch_size, self.max_wait)
+        except BaseException as e:
+            with self.lock:
+                self.loading.pop(key, None)
+            loading.set_exception(e)
+            raise
+
+        evicted = []
+        with self.lock:
+            self.loading.pop(key, None)
+            self.models[key] = batcher
+            self.loads += 1
+            while len(self.models) > self.max_models:
+                evicted.append(self.models.popitem(last=False)[1])
+                self.evictions += 1
+        loading.set_result(batcher)
+        for old in evicted:
+            old.stop()
+        return batcher
+
+    def discard(self, name, version):
+        with self.lock:
+            batcher = self.models.pop((name, str(version)), None)
+        if batcher is not None:
+            batcher.stop()
+
+    def predict(self, name, version, frame, timeout=None):
+        return self.get(name, version).submit(frame).result(timeout)
+
+    def stats(self):
+        with self.lock:
+            models = list(self.models.items())
+            res = {
+                "max_models": self.max_models,
+                "max_batch_size": self.max_batch_size,
+                "max_wait": self.max_wait,
+                "loads": self.loads,
+                "evictions": self.evictions
+            }
+        res["models"] = [{"name": name, "version": version, **batcher.stats()} for (name, version), batcher in models]
+        return res
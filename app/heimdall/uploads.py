@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class PartsReader:
+    # file-like view over the chunk files of one upload, read in order one block at a time;
+    # __len__ lets requests send a Content-Length instead of chunked encoding
+    def __init__(self, paths, size):
+        self.paths = list(paths)
+        self.size = size
+        self.current = None
+
+    def __len__(self):
+        return self.size
+
+    def read(self, n=-1):
+        n = BLOCK_SIZE if n is None or n < 0 else n
+        while True:
+            if self.current is None:
+                if not self.paths:
+                    return b""
+                self.current = open(self.paths.pop(0), "rb")
+            data = self.current.read(n)
+            if data:
+                return data
+            self.current.close()
+            self.current = None
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+class UploadStore:
+    # Multipart uploads spooled to disk: <root>/<upload_id>/manifest.json plus one <index>.part per chunk.
+    # Everything lives on disk, so chunks of one upload may land on any gunicorn worker
+    # and a failed chunk or finalize can simply be retried.
+    def __init__(self, root=None, ttl=24 * 3600):
+        self.root = root or os.path.join(tempfile.gettempdir(), "heimdall-uploads")
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+
+    def upload_dir(self, upload_id):
+        # upload ids are generated here; anything else is rejected before touching the filesystem
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except (TypeError, ValueError):
+            raise KeyError(upload_id)
+        return os.path.join(self.root, upload_id)
+
+    def create(self, user_id, run_id, path, location, size, chunk_size):
+        self.sweep()
+        upload_id = uuid.uuid4().hex
+        manifest = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "run_id": run_id,
+            "path": path,
+            "location": location,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunk_count": max((size + chunk_size - 1) // chunk_size, 1),
+            "created_at": time.time()
+        }
+        directory = self.upload_dir(upload_id)
+        os.makedirs(directory)
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def get(self, upload_id, user_id):
+        try:
+            with open(os.path.join(self.upload_dir(upload_id), "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise KeyError(upload_id)
+        if manifest["user_id"] != user_id:
+            raise KeyError(upload_id)
+        return manifest
+
+    def chunk_length(self, manifest, index):
+        if index == manifest["chunk_count"] - 1:
+            return manifest["size"] - index * manifest["chunk_size"]
+        return manifest["chunk_size"]
+
+    def put_chunk(self, manifest, index, stream, sha256):
+        if not 0 <= index < manifest["chunk_count"]:
+            raise UploadError(f"Chunk index must be between 0 and {manifest['chunk_count'] - 1}")
+        expected = self.chunk_length(manifest, index)
+
+        directory = self.upload_dir(manifest["upload_id"])
+        # a unique temp name, so retries of the same chunk racing each other never share a file
+        tmp_path = os.path.join(directory, f"{index}.{uuid.uuid4().hex}.tmp")
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while written <= expected:
+                    block = stream.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    written += len(block)
+
+            if written != expected:
+                raise UploadError(f"Chunk {index} must be {expected} bytes, got {written}")
+            if digest.hexdigest() != sha256.lower():
+                raise UploadError(f"Chunk {index} checksum mismatch")
+
+            os.replace(tmp_path, os.path.join(directory, f"{index}.part"))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        return {"index": index, "size": written, "sha256": digest.hexdigest()}
+
+    def received(self, manifest):
+        names = os.listdir(self.upload_dir(manifest["upload_id"]))
+        return sorted(int(name[:-5]) for name in names if name.endswith(".part"))
+
+    def status(self, manifest):
+        received = set(self.received(manifest))
+        return {
+            "upload_id": manifest["upload_id"],
+            "run_id": manifest["run_id"],
+            "path": manifest["path"],
+            "size": manifest["size"],
+            "chunk_size": manifest["chunk_size"],
+            "chunk_count": manifest["chunk_count"],
+            "received": sorted(received),
+            "missing": [i for i in range(manifest["chunk_count"]) if i not in received]
+        }
+
+    def reader(self, manifest):
+        directory = self.upload_dir(manifest["upload_id"])
+        missing = self.status(manifest)["missing"]
+        if missing:
+            raise UploadError(f"{len(missing)} chunk(s) missing, first is {missing[0]}")
+        paths = [os.path.join(directory, f"{i}.part") for i in range(manifest["chunk_count"])]
+        return PartsReader(paths, manifest["size"])
+
+    def delete(self, upload_id):
+        shutil.rmtree(self.upload_dir(upload_id), ignore_errors=True)
+
+    def sweep(self):
+        # abandoned uploads are dropped once they are older than ttl
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(directory) < cutoff:
+                    shutil.rmtree(directory, ignore_errors=True)
+            except OSError:
+                pass